@@ -1,19 +1,54 @@
+import os
+
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_login import LoginManager
 
-import os
+from app.config import Config
 
-app = Flask(__name__)
+# Extensions are created once here and bound to each app in create_app
+db = SQLAlchemy()
 login_manager = LoginManager()
-login_manager.init_app(app)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///school.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'default-secret-key')
 
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+def _init_migrate(app):
+    # Flask-Migrate pulls in Alembic, which only the `flask db` commands need. It is
+    # loaded when the flask CLI builds the app (inside a click context) or when
+    # MIGRATIONS_ENABLED is set; web workers start without it.
+    if not app.config['MIGRATIONS_ENABLED'] and click.get_current_context(silent=True) is None:
+        return
+    from flask_migrate import Migrate
+    Migrate(app, db)
+
+
+def create_app(config=Config):
+    app = Flask(__name__)
+    app.config.from_object(config)
+    if not app.config['PROFILE_DIR']:
+        app.config['PROFILE_DIR'] = os.path.join(app.instance_path, 'profiles')
+    if not app.config['JOB_RESULT_DIR']:
+        app.config['JOB_RESULT_DIR'] = os.path.join(app.instance_path, 'job_results')
+
+    db.init_app(app)
+    login_manager.init_app(app)
+    _init_migrate(app)
+
+    from app import models
+    from app.routes import main
+    from app.commands import init_commands
+    from app.database import init_engine
+
+    app.register_blueprint(main)
+    init_commands(app)
+    init_engine(app)
+
+    if app.config['SQL_INSTRUMENTATION']:
+        from app.instrumentation import init_sql_instrumentation
+        init_sql_instrumentation(app)
+
+    if app.config['PROFILER_ENABLED']:
+        from app.profiling import init_profiler
+        init_profiler(app)
 
-from app import models, routes, helpers
\ No newline at end of file
+    return app
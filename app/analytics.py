@@ -0,0 +1,218 @@
+from collections import Counter
+from datetime import timedelta
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import User, Department, LeaveRequest, LeaveRequestSlot, CoverAssignment, AbsenceRollup, CoverRollup
+from app.timetable_index import timetable_index
+from app.workload import week_start, term_start
+
+
+def rollup_buckets(day):
+    return [('week', week_start(day)), ('term', term_start(day))]
+
+
+def _school_days(start_date, end_date):
+    day = start_date
+    while day <= end_date:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+
+def _upsert(model, keys, rows):
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(model)
+    values = [column for column in rows[0] if column not in keys]
+    return db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={column: getattr(model, column) + getattr(statement.excluded, column) for column in values}
+        ),
+        rows
+    )
+
+
+# ---------------- Counting ------------------
+# Both return {rollup key: [counts...]} for the given rows, ready to be added
+# to (or, with delta=-1, taken off) the rollup tables.
+def _absence_counts(leave_requests, delta, selected=None):
+    # leave_requests: iterable of (id, user_id, start_date, end_date, reason, status);
+    # selected: {leave_request_id: {date: lessons}} for partial-day leave
+    selected = selected or {}
+    counts = {}
+    for leave_request_id, user_id, start_date, end_date, reason, status in leave_requests:
+        lessons = selected.get(leave_request_id)
+        for day in _school_days(start_date, end_date):
+            if lessons is not None and day not in lessons:
+                continue
+            if status != 'approved':
+                needed = 0
+            elif lessons is not None:
+                needed = lessons[day]
+            else:
+                needed = timetable_index.periods_taught(user_id, day.weekday())
+            for bucket, bucket_start in rollup_buckets(day):
+                key = (bucket, bucket_start, user_id, reason or '', status)
+                totals = counts.setdefault(key, [0, 0])
+                totals[0] += delta
+                totals[1] += needed * delta
+    return counts
+
+
+def _cover_counts(covers, delta):
+    # covers: iterable of (absent_teacher_id, covering_teacher_id, date)
+    counts = {}
+    for absent_teacher_id, covering_teacher_id, day in covers:
+        if day is None:
+            continue
+        for bucket, bucket_start in rollup_buckets(day):
+            counts.setdefault((bucket, bucket_start, covering_teacher_id), [0, 0])[0] += delta
+            counts.setdefault((bucket, bucket_start, absent_teacher_id), [0, 0])[1] += delta
+    return counts
+
+
+def _absence_rows(counts):
+    return [
+        {'bucket': bucket, 'bucket_start': bucket_start, 'teacher_id': teacher_id, 'reason': reason,
+         'status': status, 'absence_days': days, 'cover_needed': needed}
+        for (bucket, bucket_start, teacher_id, reason, status), (days, needed) in counts.items() if days or needed
+    ]
+
+
+def _cover_rows(counts):
+    return [
+        {'bucket': bucket, 'bucket_start': bucket_start, 'teacher_id': teacher_id, 'covers_given': given,
+         'covers_received': received}
+        for (bucket, bucket_start, teacher_id), (given, received) in counts.items() if given or received
+    ]
+
+
+# ---------------- Incremental updates ------------------
+# Called next to every leave and cover write, inside the caller's transaction.
+# A status change is recorded as -1 under the old status and +1 under the new.
+def record_absence(leave_request, delta=1, status=None):
+    lessons = Counter(slot.date for slot in leave_request.selected_slots)
+    rows = _absence_rows(_absence_counts([(
+        leave_request.id, leave_request.user_id, leave_request.start_date, leave_request.end_date,
+        leave_request.reason, status or leave_request.status
+    )], delta, {leave_request.id: lessons} if lessons else None))
+    if rows:
+        _upsert(AbsenceRollup, ['bucket', 'bucket_start', 'teacher_id', 'reason', 'status'], rows)
+
+
+def record_absence_status_change(leave_request, old_status):
+    if old_status != leave_request.status:
+        record_absence(leave_request, delta=-1, status=old_status)
+        record_absence(leave_request)
+
+
+def record_cover_stats(covers, delta=1):
+    rows = _cover_rows(_cover_counts(covers, delta))
+    if rows:
+        _upsert(CoverRollup, ['bucket', 'bucket_start', 'teacher_id'], rows)
+
+
+# ---------------- Backfill ------------------
+# Recomputes both rollups from the full leave and cover history, e.g. after a
+# bulk load or a timetable change that moves cover_needed.
+def rebuild_analytics():
+    db.session.execute(db.delete(AbsenceRollup))
+    db.session.execute(db.delete(CoverRollup))
+    timetable_index.ensure_built()
+
+    selected = {}
+    for leave_request_id, day, lessons in db.session.execute(
+        db.select(LeaveRequestSlot.leave_request_id, LeaveRequestSlot.date, db.func.count())
+        .group_by(LeaveRequestSlot.leave_request_id, LeaveRequestSlot.date)
+    ):
+        selected.setdefault(leave_request_id, {})[day] = lessons
+
+    leave_requests = db.session.execute(
+        db.select(LeaveRequest.id, LeaveRequest.user_id, LeaveRequest.start_date, LeaveRequest.end_date,
+                  LeaveRequest.reason, LeaveRequest.status).execution_options(yield_per=5000)
+    )
+    absence_rows = _absence_rows(_absence_counts(leave_requests, 1, selected))
+
+    counts = {}
+    covers = db.session.execute(
+        db.select(CoverAssignment.absent_teacher_id, CoverAssignment.covering_teacher_id, CoverAssignment.date,
+                  db.func.count())
+        .where(CoverAssignment.date.is_not(None))
+        .group_by(CoverAssignment.absent_teacher_id, CoverAssignment.covering_teacher_id, CoverAssignment.date)
+    )
+    for absent_teacher_id, covering_teacher_id, day, count in covers:
+        for key, (given, received) in _cover_counts([(absent_teacher_id, covering_teacher_id, day)], count).items():
+            totals = counts.setdefault(key, [0, 0])
+            totals[0] += given
+            totals[1] += received
+    cover_rows = _cover_rows(counts)
+
+    if absence_rows:
+        db.session.execute(db.insert(AbsenceRollup), absence_rows)
+    if cover_rows:
+        db.session.execute(db.insert(CoverRollup), cover_rows)
+    db.session.commit()
+    return len(absence_rows), len(cover_rows)
+
+
+# ---------------- Reads ------------------
+# Dashboard figures for one bucket, each a single GROUP BY over the rollups
+def absence_days_by(dimension, bucket, bucket_start, limit=None):
+    column = {
+        'department': db.func.coalesce(Department.name, 'No department'),
+        'reason': AbsenceRollup.reason,
+        'teacher': User.first_name + ' ' + User.last_name,
+    }[dimension]
+    query = db.select(column, db.func.sum(AbsenceRollup.absence_days).label('days')) \
+        .join(User, AbsenceRollup.teacher_id == User.id) \
+        .outerjoin(Department, User.department_id == Department.id) \
+        .where(AbsenceRollup.bucket == bucket, AbsenceRollup.bucket_start == bucket_start,
+               AbsenceRollup.status == 'approved') \
+        .group_by(column, *([User.id] if dimension == 'teacher' else [])) \
+        .having(db.func.sum(AbsenceRollup.absence_days) > 0) \
+        .order_by(db.desc('days'))
+    if limit:
+        query = query.limit(limit)
+    return db.session.execute(query).all()
+
+
+def weekly_absence_days(first_week, last_week):
+    rows = db.session.execute(
+        db.select(AbsenceRollup.bucket_start, db.func.sum(AbsenceRollup.absence_days))
+        .where(AbsenceRollup.bucket == 'week', AbsenceRollup.bucket_start.between(first_week, last_week),
+               AbsenceRollup.status == 'approved')
+        .group_by(AbsenceRollup.bucket_start)
+    ).all()
+    days = dict(rows)
+    weeks = []
+    week = first_week
+    while week <= last_week:
+        weeks.append((week, days.get(week, 0)))
+        week += timedelta(weeks=1)
+    return weeks
+
+
+def cover_by_teacher(bucket, bucket_start, limit=10):
+    return db.session.execute(
+        db.select(User.first_name, User.last_name, CoverRollup.covers_given, CoverRollup.covers_received)
+        .join(User, CoverRollup.teacher_id == User.id)
+        .where(CoverRollup.bucket == bucket, CoverRollup.bucket_start == bucket_start)
+        .order_by(CoverRollup.covers_given.desc(), CoverRollup.covers_received.desc())
+        .limit(limit)
+    ).all()
+
+
+def cover_fill_rate(bucket, bucket_start):
+    # Covers arranged as a share of the lessons approved absences left uncovered
+    needed = db.session.execute(
+        db.select(db.func.coalesce(db.func.sum(AbsenceRollup.cover_needed), 0))
+        .where(AbsenceRollup.bucket == bucket, AbsenceRollup.bucket_start == bucket_start,
+               AbsenceRollup.status == 'approved')
+    ).scalar()
+    received = db.session.execute(
+        db.select(db.func.coalesce(db.func.sum(CoverRollup.covers_received), 0))
+        .where(CoverRollup.bucket == bucket, CoverRollup.bucket_start == bucket_start)
+    ).scalar()
+    return received, needed, (min(received / needed, 1.0) if needed else None)
@@ -0,0 +1,165 @@
+from collections import defaultdict
+
+from sqlalchemy import and_, literal, type_coerce
+from sqlalchemy.orm import aliased
+
+from flask import current_app
+
+from app import db
+from app.models import User, TeachingSlot, LeaveRequest, LeaveRequestSlot, CoverAssignment
+from app.helpers import date_range, get_slot_teacher_mapping, get_leave_teaching_slots
+
+
+def _days_table(start_date, end_date):
+    # (day, dow) rows for every date in the range from a recursive CTE, so the
+    # statement is the same size however long the range is. dow counts from 0
+    # for Monday like TeachingSlot.day_of_week; only the date step differs
+    # between SQLite (date strings) and Postgres (date + integer).
+    days = db.select(
+        literal(start_date, db.Date).label('day'), literal(start_date.weekday()).label('dow')
+    ).cte('days', recursive=True)
+    if db.session.get_bind().dialect.name == 'sqlite':
+        next_day = type_coerce(db.func.date(days.c.day, '+1 day'), db.Date)
+    else:
+        next_day = days.c.day + 1
+    return days.union_all(
+        db.select(next_day, (days.c.dow + 1) % 7).where(days.c.day < end_date)
+    )
+
+
+def _on_approved_leave(teacher_id_column, day_column, period_column):
+    # Whole-day leave covering the day, or partial-day leave that selected this lesson
+    # The day and period columns belong to the outermost query, two levels up, so
+    # correlate explicitly rather than let them be pulled into this subquery's FROM
+    selected = db.select(LeaveRequestSlot.id).where(LeaveRequestSlot.leave_request_id == LeaveRequest.id) \
+        .correlate_except(LeaveRequestSlot)
+    return db.select(LeaveRequest.id).where(
+        LeaveRequest.user_id == teacher_id_column,
+        LeaveRequest.status == 'approved',
+        LeaveRequest.start_date <= day_column,
+        LeaveRequest.end_date >= day_column,
+        db.or_(
+            ~selected.exists(),
+            selected.where(LeaveRequestSlot.date == day_column,
+                           LeaveRequestSlot.period_number == period_column).exists()
+        )
+    ).exists()
+
+
+def _covering_period(teacher_id_column, day_column, period_column):
+    return db.select(CoverAssignment.id).where(
+        CoverAssignment.covering_teacher_id == teacher_id_column,
+        CoverAssignment.date == day_column,
+        CoverAssignment.period_number == period_column
+    ).exists()
+
+
+# ---------------- Set-based slot -> teacher mapping ------------------
+# Answers the whole leave request with two statements: the absent teacher's
+# slots, then one anti-join of every teacher against every (day, period)
+# occurrence in the range.
+def get_slot_teacher_mapping_sql(leave_request, teaching_slots=None):
+    absent_teacher_id = leave_request.user_id
+
+    # A partial-day leave only needs cover for the lessons it selected
+    partial = leave_request.id is not None and bool(leave_request.selected_slots)
+    if teaching_slots is None and partial:
+        teaching_slots = get_leave_teaching_slots(leave_request)
+
+    if teaching_slots is None:
+        weekdays = {}
+        for day in date_range(leave_request.start_date, leave_request.end_date):
+            weekdays.setdefault(day.weekday(), day)
+
+        teacher_slots = db.session.execute(
+            db.select(TeachingSlot.id, TeachingSlot.day_of_week)
+            .where(TeachingSlot.teacher_id == absent_teacher_id, TeachingSlot.day_of_week.in_(weekdays))
+            .order_by(TeachingSlot.id)
+        ).all()
+        teacher_slots.sort(key=lambda slot: (weekdays[slot.day_of_week], slot.id))
+    else:
+        # Occurrences are already in date order; keep the first one of each weekly slot
+        first_seen = {}
+        for occurrence in teaching_slots:
+            first_seen.setdefault(occurrence.slot_id, occurrence.day_of_week)
+        teacher_slots = list(first_seen.items())
+
+    if not teacher_slots:
+        return {}
+
+    if partial:
+        # Only the selected (slot, date) lessons, not every date in the range
+        occurrence = db.select(
+            TeachingSlot.id.label('slot_id'),
+            TeachingSlot.day_of_week,
+            TeachingSlot.period_number,
+            LeaveRequestSlot.date.label('day')
+        ).join(LeaveRequestSlot, LeaveRequestSlot.teaching_slot_id == TeachingSlot.id).where(
+            LeaveRequestSlot.leave_request_id == leave_request.id,
+            TeachingSlot.teacher_id == absent_teacher_id
+        ).subquery('occurrence')
+    else:
+        days = _days_table(leave_request.start_date, leave_request.end_date)
+        occurrence = db.select(
+            TeachingSlot.id.label('slot_id'),
+            TeachingSlot.day_of_week,
+            TeachingSlot.period_number,
+            days.c.day
+        ).join(days, days.c.dow == TeachingSlot.day_of_week).where(
+            TeachingSlot.teacher_id == absent_teacher_id
+        ).subquery('occurrence')
+
+    busy_slot = aliased(TeachingSlot)
+    rows = db.session.execute(
+        db.select(occurrence.c.slot_id, occurrence.c.day, User.id, User.first_name, User.last_name)
+        .join(User, and_(User.role == 'teacher', User.id != absent_teacher_id))
+        .outerjoin(busy_slot, and_(
+            busy_slot.teacher_id == User.id,
+            busy_slot.day_of_week == occurrence.c.day_of_week,
+            busy_slot.period_number == occurrence.c.period_number
+        ))
+        .where(
+            busy_slot.id.is_(None),
+            ~_on_approved_leave(User.id, occurrence.c.day, occurrence.c.period_number),
+            ~_covering_period(User.id, occurrence.c.day, occurrence.c.period_number)
+        )
+        .order_by(User.id)
+    ).all()
+
+    # A weekly slot can occur several times in the range; keep teachers free on
+    # every occurrence that needs cover. Given the occurrences, only those count.
+    if teaching_slots is None:
+        wanted = None
+        occurrences_per_weekday = defaultdict(int)
+        for day in date_range(leave_request.start_date, leave_request.end_date):
+            occurrences_per_weekday[day.weekday()] += 1
+        expected = {slot_id: occurrences_per_weekday[day_of_week] for slot_id, day_of_week in teacher_slots}
+    else:
+        wanted = {(occurrence.slot_id, occurrence.date) for occurrence in teaching_slots}
+        expected = defaultdict(int)
+        for slot_id, _day in wanted:
+            expected[slot_id] += 1
+
+    free_counts = defaultdict(lambda: defaultdict(int))
+    names = {}
+    for slot_id, day, teacher_id, first_name, last_name in rows:
+        if wanted is not None and (slot_id, day) not in wanted:
+            continue
+        free_counts[slot_id][teacher_id] += 1
+        names[teacher_id] = f"{first_name} {last_name}"
+
+    return {
+        slot_id: [
+            {"id": teacher_id, "name": names[teacher_id]}
+            for teacher_id, count in free_counts[slot_id].items()
+            if count == expected[slot_id]
+        ]
+        for slot_id, _day_of_week in teacher_slots
+    }
+
+
+# The Python/index engine stays the default; set AVAILABILITY_ENGINE = 'sql' to answer in the database
+def get_available_teacher_mapping(leave_request, teaching_slots=None):
+    if current_app.config.get('AVAILABILITY_ENGINE') == 'sql':
+        return get_slot_teacher_mapping_sql(leave_request, teaching_slots)
+    return get_slot_teacher_mapping(leave_request, teaching_slots)
@@ -0,0 +1,268 @@
+# app/bench.py
+#
+# Benchmarks for the cover-assignment hot paths. Each school size is seeded
+# into its own throwaway database and measured in a fresh process:
+#
+#   python -m app.bench --sizes 20 150 500 --output bench.json
+#   python -m app.bench --baseline bench.json --threshold 1.5
+#
+# With --baseline the run exits non-zero if any path got slower (beyond the
+# threshold), issues more SQL statements, or peaks at more memory than before.
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DEFAULT_SIZES = [20, 150, 500]
+SEED_OPTIONS = {'days': 5, 'periods': 6, 'terms': 2, 'absence_rate': 0.05, 'seed': 42}
+
+MIN_SLOWDOWN_MS = 1.0  # Timing differences below this are noise, whatever the ratio
+
+
+# ---------------- Measurement ------------------
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def _measure(prepare, run, cleanup, repeat):
+    # prepare() -> args for run(*args), untimed; cleanup(args) undoes any writes, untimed.
+    # The first run is a warm-up; memory is measured on a separate run so
+    # tracemalloc does not slow down the timed ones.
+    from app import db
+
+    counter = StatementCounter()
+    engine = db.engine
+    timings = []
+    statements = 0
+    for attempt in range(repeat + 2):
+        db.session.remove()
+        args = prepare()
+        counter.count = 0
+        if attempt == repeat + 1:
+            tracemalloc.start()
+        db.event.listen(engine, 'before_cursor_execute', counter)
+        started = time.perf_counter()
+        try:
+            run(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            db.event.remove(engine, 'before_cursor_execute', counter)
+        if attempt == repeat + 1:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        elif attempt:
+            timings.append(elapsed * 1000)
+            statements = counter.count
+        cleanup(args)
+
+    return {
+        'wall_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'sql_statements': statements,
+        'peak_kib': round(peak / 1024, 1)
+    }
+
+
+def _bench_paths(app, leave_request_id, client):
+    from app import db
+    from app.models import LeaveRequest, CoverAssignment
+    from app.forms import CoverAssignmentForm
+    from app.helpers import (
+        get_teaching_slots_by_date_range, get_slot_teacher_mapping, populate_slot_forms, save_cover_assignments,
+        get_leave_request
+    )
+    from app.cover_solver import auto_assign_cover
+    from app.workload import record_cover_workload
+    from app.analytics import record_cover_stats
+
+    def leave_request():
+        # Loaded as the views load it, with its selected slots joined in
+        return (get_leave_request(leave_request_id),)
+
+    def no_cleanup(args):
+        pass
+
+    def prepare_save():
+        # A filled-in cover form for the whole absence, as the admin would submit it
+        leave, = leave_request()
+        teaching_slots = get_teaching_slots_by_date_range(leave.user_id, leave.start_date, leave.end_date)
+        mapping = get_slot_teacher_mapping(leave, teaching_slots)
+        context = app.test_request_context('/assign-cover/%d' % leave_request_id, method='POST')
+        context.push()
+        form = CoverAssignmentForm()
+        populate_slot_forms(form, teaching_slots, mapping)
+        form.prefill(auto_assign_cover(leave, teaching_slots, mapping))
+        return form, leave, context
+
+    def cleanup_save(args):
+        _form, leave, context = args
+        saved = db.session.execute(
+            db.select(CoverAssignment.absent_teacher_id, CoverAssignment.covering_teacher_id,
+                      CoverAssignment.date).where(
+                CoverAssignment.absent_teacher_id == leave.user_id,
+                CoverAssignment.date.between(leave.start_date, leave.end_date)
+            )
+        ).all()
+        db.session.execute(db.delete(CoverAssignment).where(
+            CoverAssignment.absent_teacher_id == leave.user_id,
+            CoverAssignment.date.between(leave.start_date, leave.end_date)
+        ))
+        record_cover_workload(((covering, day) for _absent, covering, day in saved), delta=-1)
+        record_cover_stats(saved, delta=-1)
+        db.session.commit()
+        context.pop()
+
+    def get(url):
+        def run():
+            response = client.get(url)
+            assert response.status_code == 200, f'{url} returned {response.status_code}'
+        return run
+
+    return [
+        ('get_teaching_slots_by_date_range', leave_request,
+         lambda leave: get_teaching_slots_by_date_range(leave.user_id, leave.start_date, leave.end_date), no_cleanup),
+        ('get_slot_teacher_mapping', leave_request, get_slot_teacher_mapping, no_cleanup),
+        ('save_cover_assignments', prepare_save, lambda form, leave, _context: save_cover_assignments(form, leave),
+         cleanup_save),
+        ('GET /assign-cover/<id>', tuple, get(f'/assign-cover/{leave_request_id}'), no_cleanup),
+        ('GET /fetch-slot-teachers/<id>', tuple, get(f'/fetch-slot-teachers/{leave_request_id}'), no_cleanup),
+    ]
+
+
+def run_size(teachers, repeat):
+    # Runs inside the worker process, against the database named by DATABASE_URL
+    from app import create_app, db
+    from app.models import LeaveRequest
+    from app.seed import seed_data
+
+    seed_data(teachers=teachers, **SEED_OPTIONS)
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        # The upcoming absence with the most days is the one still waiting for cover
+        leave_request_id = db.session.execute(
+            db.select(LeaveRequest.id).filter_by(status='pending')
+            .order_by((LeaveRequest.end_date - LeaveRequest.start_date).desc(), LeaveRequest.id)
+        ).scalar()
+        if leave_request_id is None:
+            raise SystemExit(f'No pending leave request was seeded for {teachers} teachers.')
+
+        client = app.test_client()
+        client.post('/login', data={'email': 'admin@example.com', 'password': 'password'})
+
+        return {
+            name: _measure(prepare, run, cleanup, repeat)
+            for name, prepare, run, cleanup in _bench_paths(app, leave_request_id, client)
+        }
+
+
+# ---------------- Driver ------------------
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, repeat):
+    results = {}
+    for teachers in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            result_path = os.path.join(directory, 'result.json')
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(directory, 'bench.db')}")
+            subprocess.run(
+                [sys.executable, '-m', 'app.bench', '--worker', str(teachers), '--repeat', str(repeat),
+                 '--result', result_path],
+                env=env, check=True, stdout=subprocess.DEVNULL
+            )
+            with open(result_path) as result_file:
+                results[str(teachers)] = json.load(result_file)
+    return {
+        'revision': _git_revision(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'seed': SEED_OPTIONS,
+        'results': results
+    }
+
+
+def compare(baseline, current, threshold):
+    # Returns one message per regressed measurement
+    regressions = []
+    for size, paths in current['results'].items():
+        for name, measured in paths.items():
+            before = baseline.get('results', {}).get(size, {}).get(name)
+            if before is None:
+                continue
+            if measured['wall_ms'] > before['wall_ms'] * threshold and \
+                    measured['wall_ms'] - before['wall_ms'] > MIN_SLOWDOWN_MS:
+                regressions.append(f"{size} teachers, {name}: {before['wall_ms']} ms -> {measured['wall_ms']} ms")
+            if measured['sql_statements'] > before['sql_statements']:
+                regressions.append(f"{size} teachers, {name}: {before['sql_statements']} -> "
+                                   f"{measured['sql_statements']} SQL statements")
+            if measured['peak_kib'] > before['peak_kib'] * threshold:
+                regressions.append(f"{size} teachers, {name}: {before['peak_kib']} KiB -> "
+                                   f"{measured['peak_kib']} KiB peak memory")
+    return regressions
+
+
+def _print_report(report):
+    print(f"{'teachers':>8}  {'path':<34}{'wall ms':>10}{'min ms':>10}{'sql':>6}{'peak KiB':>11}")
+    for size, paths in report['results'].items():
+        for name, measured in paths.items():
+            print(f"{size:>8}  {name:<34}{measured['wall_ms']:>10}{measured['min_ms']:>10}"
+                  f"{measured['sql_statements']:>6}{measured['peak_kib']:>11}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the cover-assignment hot paths.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='School sizes, in teachers.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per path; the median is reported.')
+    parser.add_argument('--output', default='bench.json', help='Where to write the results.')
+    parser.add_argument('--baseline', default=None, help='Earlier results to compare against.')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='Allowed slowdown and memory growth over the baseline, as a ratio.')
+    parser.add_argument('--worker', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--result', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        with open(args.result, 'w') as result_file:
+            json.dump(run_size(args.worker, args.repeat), result_file)
+        return
+
+    report = run_benchmarks(args.sizes, args.repeat)
+    _print_report(report)
+    with open(args.output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f'Results written to {args.output}.')
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(json.load(baseline_file), report, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions against {args.baseline}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+import time
+
+import click
+from flask.cli import AppGroup, with_appcontext
+
+from app import db
+
+# Command modules are imported when the command runs, so `flask --help` and
+# unrelated commands do not load the planner or the query plan checker.
+
+cover_cli = AppGroup('cover', help='Cover planning commands.')
+
+
+def _print_plan(plan):
+    from app.planner import get_plan_teacher_names
+
+    names = get_plan_teacher_names(plan)
+    for planned in plan.assigned:
+        click.echo(f"{planned.date} P{planned.period_number} {planned.subject} {planned.year_group}: "
+                   f"{names[planned.absent_teacher_id]} -> {names[planned.covering_teacher_id]}")
+    for planned in plan.unfilled:
+        click.echo(f"{planned.date} P{planned.period_number} {planned.subject} {planned.year_group}: "
+                   f"{names[planned.absent_teacher_id]} -> UNFILLED")
+    click.echo(f"{len(plan.assigned)} slots assigned, {len(plan.unfilled)} unfilled.")
+
+
+# flask cover plan 2026-11-02 [--end 2026-11-06] [--dry-run]
+@cover_cli.command('plan')
+@click.argument('start_date', type=click.DateTime(formats=['%Y-%m-%d']))
+@click.option('--end', 'end_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last date to plan (defaults to START_DATE).')
+@click.option('--dry-run', is_flag=True, help='Print the plan without saving it.')
+def plan_command(start_date, end_date, dry_run):
+    from app.planner import plan_cover, apply_cover_plan
+
+    start_date = start_date.date()
+    end_date = end_date.date() if end_date else start_date
+
+    plan = plan_cover(start_date, end_date)
+    _print_plan(plan)
+    if not dry_run:
+        conflicts = apply_cover_plan(plan)
+        if conflicts:
+            for planned, message in conflicts.items():
+                click.echo(f"{planned.date} P{planned.period_number}: {message}", err=True)
+            raise click.ClickException('Cover plan not saved: it clashes with existing cover assignments.')
+        click.echo('Cover plan saved.')
+
+
+# flask cover rebuild-workload
+@cover_cli.command('rebuild-workload')
+def rebuild_workload_command():
+    from app.workload import rebuild_workload
+
+    buckets = rebuild_workload()
+    click.echo(f'Rebuilt {buckets} cover workload buckets.')
+
+
+# flask check-query-plans: fails if a hot helper query falls back to a full table scan
+@click.command('check-query-plans')
+@with_appcontext
+@click.option('--leave-request', 'leave_request_id', type=int, default=None,
+              help='Leave request to drive the helpers with (defaults to the first approved one).')
+def check_query_plans_command(leave_request_id):
+    from app.models import LeaveRequest
+    from app.query_plans import check_query_plans
+
+    leave_request = db.session.get(LeaveRequest, leave_request_id) if leave_request_id else None
+    failures = check_query_plans(leave_request)
+
+    for name, statement, tables, plan in failures:
+        click.echo(f"{name}: full scan of {', '.join(tables)}", err=True)
+        click.echo(f"  {' '.join(statement.split())}", err=True)
+        for line in plan:
+            click.echo(f"    {line}", err=True)
+    if failures:
+        raise click.ClickException(f'{len(failures)} hot queries fall back to a full table scan.')
+    click.echo('All hot queries use an index.')
+
+
+# flask cover rebuild-analytics: backfills the absence and cover rollups from the full history
+@cover_cli.command('rebuild-analytics')
+def rebuild_analytics_command():
+    from app.analytics import rebuild_analytics
+
+    absence_rows, cover_rows = rebuild_analytics()
+    click.echo(f'Rebuilt {absence_rows} absence and {cover_rows} cover rollup rows.')
+
+
+report_cli = AppGroup('report', help='Report exports.')
+
+
+# Writes a CSV or XLSX report chunk by chunk, so memory stays flat however many rows it has
+@report_cli.command('export')
+@click.argument('report', type=click.Choice(['leave', 'covers']))
+@click.option('--from', 'start_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='First date to include.')
+@click.option('--to', 'end_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last date to include.')
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'xlsx']), default='csv', show_default=True,
+              help='File format.')
+@click.option('--output', '-o', type=click.File('wb'), default='-',
+              help='File to write (defaults to stdout).')
+def export_report_command(report, start_date, end_date, file_format, output):
+    from app.reports import FORMATS
+
+    generate, _mimetype = FORMATS[file_format]
+    for chunk in generate(report, start_date and start_date.date(), end_date and end_date.date()):
+        output.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+
+
+timetable_cli = AppGroup('timetable', help='Timetable commands.')
+
+
+def _print_timetable_diff(result, show):
+    from app.models import User, Lesson
+    from app.timetable_import import DAY_NAMES
+
+    emails = dict(db.session.execute(db.select(User.id, User.email)).all())
+    lessons = {lesson_id: (subject, year_group) for lesson_id, subject, year_group in
+               db.session.execute(db.select(Lesson.id, Lesson.subject, Lesson.year_group))}
+
+    def slot(key):
+        teacher_id, day_of_week, period_number = key
+        return f"{emails.get(teacher_id, teacher_id)} {DAY_NAMES[day_of_week][:3].title()} P{period_number}"
+
+    def lesson(value):
+        return ' '.join(value) if value else '(none)'
+
+    lines = [f"+ {slot(key)}: {lesson(new)}" for key, new in result.added[:show]]
+    lines += [f"~ {slot(key)}: {lesson(lessons.get(old))} -> {lesson(new)}"
+              for _slot_id, key, old, new in result.changed[:show]]
+    lines += [f"- {slot(key)}: {lesson(lessons.get(old))}" for _slot_id, key, old in result.removed[:show]]
+    for line in lines:
+        click.echo(line)
+
+
+# flask timetable import FILE: loads the termly MIS timetable export
+# (teacher email, day, period, subject, year group) in one transaction
+@timetable_cli.command('import')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--dry-run', is_flag=True, help='Show what would change without writing anything.')
+@click.option('--prune', is_flag=True, help='Delete slots the file no longer lists (unless cover refers to them).')
+@click.option('--show', type=int, default=20, help='Changes of each kind to list (default 20).')
+@click.option('--batch-size', type=int, default=5000, help='Rows per executemany batch.')
+def import_timetable_command(csv_file, dry_run, prune, show, batch_size):
+    from app.timetable_import import import_timetable, TimetableImportError
+
+    started = time.perf_counter()
+    try:
+        result = import_timetable(csv_file, dry_run=dry_run, prune=prune, batch_size=batch_size)
+    except TimetableImportError as error:
+        for line, message in error.errors[:100]:
+            click.echo(f'line {line}: {message}', err=True)
+        raise click.ClickException(f'{error} Nothing was imported.')
+    elapsed = time.perf_counter() - started
+
+    if dry_run:
+        _print_timetable_diff(result, show)
+    removed = 'removed' if result.pruned else ('to remove' if dry_run and prune else 'not in the file (kept)')
+    click.echo(f"{result.rows} rows in {elapsed:.2f}s: {len(result.added)} slots added, "
+               f"{len(result.changed)} changed, {result.unchanged} unchanged, {len(result.removed)} {removed}, "
+               f"{len(result.new_lessons)} new lessons.")
+    if result.kept:
+        click.echo(f'{len(result.kept)} slots no longer in the file were kept because cover assignments or '
+                   f'partial-day leave refer to them.')
+    if dry_run:
+        click.echo('Dry run: nothing was written.')
+    elif result.added or result.changed or result.pruned:
+        click.echo("Run 'flask cover rebuild-analytics' to recount the cover each absence needs.")
+
+
+# flask worker: runs queued background jobs (auto-assign, report exports,
+# analytics rebuilds) until stopped. Run as many workers as needed.
+@click.command('worker')
+@with_appcontext
+@click.option('--threads', type=int, default=None, help='Jobs run at once (defaults to JOB_WORKER_THREADS).')
+@click.option('--poll-interval', type=float, default=None,
+              help='Seconds between polls of an empty queue (defaults to JOB_POLL_INTERVAL).')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+def worker_command(threads, poll_interval, burst):
+    from app.jobs import run_worker
+
+    run_worker(threads=threads, poll_interval=poll_interval, burst=burst)
+
+
+def init_commands(app):
+    app.cli.add_command(cover_cli)
+    app.cli.add_command(report_cli)
+    app.cli.add_command(timetable_cli)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(worker_command)
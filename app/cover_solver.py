@@ -0,0 +1,224 @@
+import heapq
+from collections import defaultdict
+
+from app import db
+from app.models import User
+from app.timetable_index import timetable_index
+from app.workload import week_start, term_start, workload_buckets, get_workload
+
+# Fairness weights, in cost units per cover (or per lesson already taught that day)
+WEEK_WEIGHT = 4
+TERM_WEIGHT = 1
+DAY_WEIGHT = 3
+DEPARTMENT_BONUS = 5
+
+INFINITY = float('inf')
+
+
+# ---------------- Min-cost flow ------------------
+# Successive shortest augmenting paths (Dijkstra with potentials). Every
+# supply arc has unit capacity, so each augmentation fills exactly one slot
+# and the final flow is the cheapest way to fill as many slots as possible.
+class MinCostFlow:
+    def __init__(self, node_count):
+        self.graph = [[] for _ in range(node_count)]
+
+    def add_node(self):
+        self.graph.append([])
+        return len(self.graph) - 1
+
+    def add_edge(self, source, target, capacity, cost):
+        edge = [target, capacity, cost, len(self.graph[target])]
+        self.graph[source].append(edge)
+        self.graph[target].append([source, 0, -cost, len(self.graph[source]) - 1])
+        return edge
+
+    def solve(self, source, sink):
+        graph = self.graph
+        node_count = len(graph)
+        potential = [0] * node_count
+        flow = 0
+
+        while True:
+            distance = [INFINITY] * node_count
+            previous = [None] * node_count
+            distance[source] = 0
+            heap = [(0, source)]
+
+            while heap:
+                dist, node = heapq.heappop(heap)
+                if dist > distance[node]:
+                    continue
+                for index, (target, capacity, cost, _reverse) in enumerate(graph[node]):
+                    if capacity <= 0:
+                        continue
+                    candidate = dist + cost + potential[node] - potential[target]
+                    if candidate < distance[target]:
+                        distance[target] = candidate
+                        previous[target] = (node, index)
+                        heapq.heappush(heap, (candidate, target))
+
+            if distance[sink] == INFINITY:
+                return flow
+
+            for node in range(node_count):
+                if distance[node] < INFINITY:
+                    potential[node] += distance[node]
+
+            node = sink
+            while node != source:
+                parent, index = previous[node]
+                edge = graph[parent][index]
+                edge[1] -= 1
+                graph[node][edge[3]][1] += 1
+                node = parent
+            flow += 1
+
+
+# ---------------- Fairness cost model ------------------
+class FairnessCosts:
+    def __init__(self, departments, workload):
+        # workload: {(teacher_id, bucket, bucket_start): covers}, as in CoverWorkload
+        self.departments = departments
+        self.workload = workload
+
+    def covers_in(self, teacher_id, bucket, bucket_start):
+        return self.workload.get((teacher_id, bucket, bucket_start), 0)
+
+    def load_cost(self, teacher_id, day):
+        day_load = timetable_index.periods_taught(teacher_id, day.weekday()) + self.covers_in(teacher_id, 'day', day)
+
+        return (
+            WEEK_WEIGHT * self.covers_in(teacher_id, 'week', week_start(day))
+            + TERM_WEIGHT * self.covers_in(teacher_id, 'term', term_start(day))
+            + DAY_WEIGHT * day_load
+        )
+
+    def department_cost(self, teacher_id, department_id):
+        # Kept non-negative so the flow can start from zero potentials
+        if department_id is not None and self.departments.get(teacher_id) == department_id:
+            return 0
+        return DEPARTMENT_BONUS
+
+    def marginal_cost(self, covers_today):
+        # Each extra cover on the same day adds to the day, week and term loads at once
+        return (DAY_WEIGHT + WEEK_WEIGHT + TERM_WEIGHT) * covers_today
+
+    def record(self, teacher_id, day):
+        for bucket, bucket_start in workload_buckets(day):
+            key = (teacher_id, bucket, bucket_start)
+            self.workload[key] = self.workload.get(key, 0) + 1
+
+
+def load_fairness_costs(teacher_ids, start_date, end_date):
+    departments = dict(db.session.execute(
+        db.select(User.id, User.department_id).where(User.id.in_(teacher_ids))
+    ).all())
+    return FairnessCosts(departments, get_workload(teacher_ids, start_date, end_date))
+
+
+# ---------------- Cover solver ------------------
+# Solves one date at a time as a min-cost flow:
+#   source -> slot -> (teacher, period) -> teacher -> sink
+# The (teacher, period) node stops a teacher covering two classes at once and
+# the teacher -> sink arcs carry the rising cost of each extra cover that day.
+# Loads from earlier dates are carried forward before the next date is solved.
+def solve_cover(slots, candidates, costs):
+    # slots: {key: (date, period_number, department_id)}; candidates: {key: [teacher_id, ...]}
+    slots_by_date = defaultdict(list)
+    for key, (day, _period_number, _department_id) in slots.items():
+        slots_by_date[day].append(key)
+
+    assignment = {}
+    for day in sorted(slots_by_date):
+        day_assignment = _solve_day(day, slots_by_date[day], slots, candidates, costs)
+        for key, teacher_id in day_assignment.items():
+            costs.record(teacher_id, day)
+        assignment.update(day_assignment)
+
+    return assignment
+
+
+def _solve_day(day, keys, slots, candidates, costs):
+    flow = MinCostFlow(2)
+    source, sink = 0, 1
+
+    load_costs = {}
+    slot_edges = defaultdict(list)
+    teacher_nodes = {}
+    teacher_period_nodes = {}
+    periods_per_teacher = defaultdict(int)
+    for key in keys:
+        _day, period_number, department_id = slots[key]
+        slot_node = flow.add_node()
+        flow.add_edge(source, slot_node, 1, 0)
+
+        slot_costs = []
+        for teacher_id in candidates.get(key, ()):
+            if teacher_id not in load_costs:
+                load_costs[teacher_id] = costs.load_cost(teacher_id, day)
+            slot_costs.append((load_costs[teacher_id] + costs.department_cost(teacher_id, department_id), teacher_id))
+
+        # Only a slot's len(keys) cheapest teachers can appear in an optimal
+        # plan: one of them is always left without a cover today to swap in.
+        for cost, teacher_id in heapq.nsmallest(len(keys), slot_costs):
+            if teacher_id not in teacher_nodes:
+                teacher_nodes[teacher_id] = flow.add_node()
+
+            period_key = (teacher_id, period_number)
+            if period_key not in teacher_period_nodes:
+                teacher_period_nodes[period_key] = flow.add_node()
+                flow.add_edge(teacher_period_nodes[period_key], teacher_nodes[teacher_id], 1, 0)
+                periods_per_teacher[teacher_id] += 1
+
+            edge = flow.add_edge(slot_node, teacher_period_nodes[period_key], 1, cost)
+            slot_edges[key].append((edge, teacher_id))
+
+    for teacher_id, teacher_node in teacher_nodes.items():
+        for covers_today in range(periods_per_teacher[teacher_id]):
+            flow.add_edge(teacher_node, sink, 1, costs.marginal_cost(covers_today))
+
+    flow.solve(source, sink)
+
+    return {
+        key: teacher_id
+        for key, edges in slot_edges.items()
+        for edge, teacher_id in edges
+        if edge[1] == 0
+    }
+
+
+def auto_assign_cover(leave_request, teaching_slots, slot_teacher_mapping):
+    absent_department_id = db.session.execute(
+        db.select(User.department_id).where(User.id == leave_request.user_id)
+    ).scalar()
+
+    slots = {}
+    candidates = {}
+    for occurrence in teaching_slots:
+        key = (occurrence.slot_id, occurrence.date)
+        slots[key] = (occurrence.date, occurrence.period_number, absent_department_id)
+        candidates[key] = [teacher['id'] for teacher in slot_teacher_mapping.get(occurrence.slot_id, [])]
+
+    teacher_ids = {teacher_id for teacher_ids in candidates.values() for teacher_id in teacher_ids}
+    if not teacher_ids:
+        return {}
+
+    costs = load_fairness_costs(teacher_ids, leave_request.start_date, leave_request.end_date)
+    return solve_cover(slots, candidates, costs)
+
+
+# The auto-assign proposal as JSON-ready lists, the shape /api/auto-assign and
+# the background auto-assign job both return
+def auto_assign_summary(teaching_slots, slot_teacher_mapping, assignment):
+    names = {teacher['id']: teacher['name'] for teachers in slot_teacher_mapping.values() for teacher in teachers}
+    assignments = []
+    unfilled = []
+    for slot in teaching_slots:
+        slot_json = {"slot_id": slot.slot_id, "date": slot.date.isoformat(), "period_number": slot.period_number}
+        teacher_id = assignment.get((slot.slot_id, slot.date))
+        if teacher_id is None:
+            unfilled.append(slot_json)
+        else:
+            assignments.append(dict(slot_json, teacher_id=teacher_id, name=names[teacher_id]))
+    return {"assignments": assignments, "unfilled": unfilled}
@@ -0,0 +1,142 @@
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import date
+
+from flask import current_app
+
+from app import db
+from app.models import User, Lesson, TeachingSlot, LeaveRequest, CoverAssignment
+from app.data_version import TIMETABLE, get_data_versions, teacher_version
+from app.timetable_index import timetable_index
+
+UPCOMING_COVERS = 20  # Covers listed on the dashboard
+
+DashboardLeave = namedtuple('DashboardLeave', ['id', 'start_date', 'end_date', 'reason', 'status'])
+DashboardCover = namedtuple('DashboardCover', [
+    'date', 'period_number', 'subject', 'year_group', 'absent_teacher'
+])
+DashboardLesson = namedtuple('DashboardLesson', [
+    'period_number', 'subject', 'year_group', 'cover_for'  # cover_for: the absent teacher's name, for covers
+])
+TeacherDashboard = namedtuple('TeacherDashboard', [
+    'pending_requests', 'approved_requests', 'upcoming_covers', 'today', 'on_leave_today'
+])
+
+
+# ---------------- Loading ------------------
+# Everything on a teacher's dashboard as plain tuples, in two queries: their
+# current and future pending/approved leave, and the covers they are due to
+# teach (with lesson and absent teacher joined in). Today's own lessons come
+# from the in-memory timetable snapshot, or one more query if it is too large.
+def _todays_lessons(teacher_id, day):
+    snapshot = timetable_index.snapshot()
+    if snapshot.complete:
+        return [(period_number, subject, year_group)
+                for _slot_id, _day, period_number, subject, year_group in snapshot.slots_on(teacher_id, day.weekday())]
+    return db.session.execute(
+        db.select(TeachingSlot.period_number, Lesson.subject, Lesson.year_group)
+        .outerjoin(Lesson, TeachingSlot.lesson_id == Lesson.id)
+        .where(TeachingSlot.teacher_id == teacher_id, TeachingSlot.day_of_week == day.weekday())
+    ).all()
+
+
+def load_teacher_dashboard(teacher_id, today):
+    leave = [DashboardLeave(*row) for row in db.session.execute(
+        db.select(LeaveRequest.id, LeaveRequest.start_date, LeaveRequest.end_date, LeaveRequest.reason,
+                  LeaveRequest.status)
+        .where(LeaveRequest.user_id == teacher_id, LeaveRequest.end_date >= today,
+               LeaveRequest.status.in_(('pending', 'approved')))
+        .order_by(LeaveRequest.start_date, LeaveRequest.id)
+    )]
+
+    covers = [
+        DashboardCover(day, period_number, subject, year_group, f'{first_name} {last_name}')
+        for day, period_number, subject, year_group, first_name, last_name in db.session.execute(
+            db.select(CoverAssignment.date, TeachingSlot.period_number, Lesson.subject, Lesson.year_group,
+                      User.first_name, User.last_name)
+            .join(TeachingSlot, CoverAssignment.teaching_slot_id == TeachingSlot.id)
+            .outerjoin(Lesson, TeachingSlot.lesson_id == Lesson.id)
+            .join(User, CoverAssignment.absent_teacher_id == User.id)
+            .where(CoverAssignment.covering_teacher_id == teacher_id, CoverAssignment.date >= today)
+            .order_by(CoverAssignment.date, CoverAssignment.period_number, CoverAssignment.id)
+            .limit(UPCOMING_COVERS)
+        )
+    ]
+
+    # Own lessons and today's covers, in period order
+    lessons = [DashboardLesson(period_number, subject, year_group, None)
+               for period_number, subject, year_group in _todays_lessons(teacher_id, today)]
+    lessons += [DashboardLesson(cover.period_number, cover.subject, cover.year_group, cover.absent_teacher)
+                for cover in covers if cover.date == today]
+    lessons.sort(key=lambda lesson: lesson.period_number)
+
+    return TeacherDashboard(
+        pending_requests=[request for request in leave if request.status == 'pending'],
+        approved_requests=[request for request in leave if request.status == 'approved'],
+        upcoming_covers=covers,
+        today=lessons,
+        on_leave_today=any(request.status == 'approved' and request.start_date <= today for request in leave),
+    )
+
+
+# ---------------- Dashboard cache ------------------
+# Per-process LRU of each teacher's dashboard, stored with the versions it was
+# built from: their own 'teacher:<id>' version (bumped by any write to their
+# leave or covers), the timetable version, and the date. A request reads
+# those versions in one query and reuses the entry while they all match, so
+# repeat visits cost no dashboard queries and other teachers' changes never
+# evict it.
+class DashboardCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # teacher_id -> (key, TeacherDashboard)
+
+    def get(self, teacher_id, key):
+        with self._lock:
+            entry = self._entries.get(teacher_id)
+            if entry is not None and entry[0] == key:
+                self._entries.move_to_end(teacher_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, teacher_id, key, dashboard):
+        with self._lock:
+            self._entries[teacher_id] = (key, dashboard)
+            self._entries.move_to_end(teacher_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+def get_dashboard_cache():
+    # One cache per application, sized from TEACHER_DASHBOARD_CACHE_SIZE
+    cache = current_app.extensions.get('dashboard_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            'dashboard_cache', DashboardCache(current_app.config['TEACHER_DASHBOARD_CACHE_SIZE'])
+        )
+    return cache
+
+
+def get_teacher_dashboard(teacher_id):
+    today = date.today()
+    versions = get_data_versions([TIMETABLE, teacher_version(teacher_id)])
+    key = (today, versions[TIMETABLE], versions[teacher_version(teacher_id)])
+
+    cache = get_dashboard_cache()
+    dashboard = cache.get(teacher_id, key)
+    if dashboard is None:
+        dashboard = load_teacher_dashboard(teacher_id, today)
+        cache.put(teacher_id, key, dashboard)
+    return dashboard
@@ -0,0 +1,148 @@
+from collections import defaultdict
+
+from flask import g, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+from app.models import User, Department, Lesson, TeachingSlot, LeaveRequest, LeaveRequestSlot, CoverAssignment, DataVersion
+
+# Names of the versioned data sets
+TIMETABLE = 'timetable'
+USERS = 'user'
+LEAVE_REQUESTS = 'leave_request'
+COVER_ASSIGNMENTS = 'cover_assignment'
+ALL_DATA_VERSIONS = (TIMETABLE, USERS, LEAVE_REQUESTS, COVER_ASSIGNMENTS)
+
+_listeners = defaultdict(list)  # name -> callbacks run after a local commit changes it
+
+
+# ---------------- Reading versions ------------------
+# Each name is read from the database at most once per app context (i.e. once
+# per request); refresh=True forces a new read.
+def get_data_version(name, refresh=False):
+    versions = g.setdefault('data_versions', {})
+    if refresh or name not in versions:
+        versions[name] = db.session.execute(
+            db.select(DataVersion.version).where(DataVersion.name == name)
+        ).scalar() or 0
+    return versions[name]
+
+
+def get_data_versions(names):
+    # {name: version} for several names, reading any not yet seen this request in one query
+    versions = g.setdefault('data_versions', {})
+    missing = [name for name in names if name not in versions]
+    if missing:
+        versions.update({name: 0 for name in missing})
+        versions.update(db.session.execute(
+            db.select(DataVersion.name, DataVersion.version).where(DataVersion.name.in_(missing))
+        ).all())
+    return {name: versions[name] for name in names}
+
+
+# ---------------- Bumping versions ------------------
+def _bump(session, names):
+    connection = session.connection()
+    dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(DataVersion.__table__)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=['name'],
+            set_={'version': DataVersion.__table__.c.version + 1}
+        ),
+        [{'name': name, 'version': 1} for name in sorted(names)]
+    )
+    session.info.setdefault('bumped_data_versions', set()).update(names)
+
+
+# Runs inside the caller's transaction. Core bulk writes, which skip the ORM
+# events, call this directly before committing.
+def bump_data_version(*names):
+    _bump(db.session, set(names))
+
+
+# Per-teacher versions ('teacher:<id>') let caches of one teacher's own data
+# (see app/dashboard.py) survive writes that only touch other teachers.
+def teacher_version(teacher_id):
+    return f'teacher:{teacher_id}'
+
+
+def teacher_versions(teacher_ids):
+    # Names to pass to bump_data_version with the data set's own name, so all are bumped in one statement
+    return {teacher_version(teacher_id) for teacher_id in teacher_ids if teacher_id is not None}
+
+
+def on_data_version_change(name, callback):
+    _listeners[name].append(callback)
+
+
+# ---------------- Tracking ORM writes ------------------
+# Any insert, update or delete of one of the models bumps the named version
+# when the session flushes.
+def track_data_version(name, *models):
+    def changed(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault('changed_data_versions', set()).add(name)
+
+    for model in models:
+        for event_name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, event_name, changed)
+
+
+# Bumps the version of every teacher the row belongs to, before and after an
+# update, e.g. both the old and the new covering teacher
+def track_teacher_version(model, *attributes):
+    def changed(mapper, connection, target):
+        session = object_session(target)
+        if session is None:
+            return
+        state = inspect(target)
+        teacher_ids = set()
+        for attribute in attributes:
+            history = state.attrs[attribute].history
+            teacher_ids.update(history.added or history.unchanged or ())
+            teacher_ids.update(history.deleted or ())
+        session.info.setdefault('changed_data_versions', set()).update(
+            teacher_version(teacher_id) for teacher_id in teacher_ids if teacher_id is not None
+        )
+
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, changed)
+
+
+track_data_version(TIMETABLE, TeachingSlot, Lesson)
+track_data_version(USERS, User, Department)
+track_data_version(LEAVE_REQUESTS, LeaveRequest, LeaveRequestSlot)
+track_data_version(COVER_ASSIGNMENTS, CoverAssignment)
+track_teacher_version(LeaveRequest, 'user_id')
+track_teacher_version(CoverAssignment, 'absent_teacher_id', 'covering_teacher_id')
+track_teacher_version(TeachingSlot, 'teacher_id')
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_changed_versions(session, flush_context):
+    names = session.info.pop('changed_data_versions', None)
+    if names:
+        _bump(session, names)
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_version_changes(session):
+    names = session.info.pop('bumped_data_versions', None)
+    if not names or not has_app_context():
+        return
+    versions = g.get('data_versions')
+    for name in names:
+        if versions is not None:
+            versions.pop(name, None)
+        for callback in _listeners.get(name, ()):
+            callback()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_version_changes(session):
+    session.info.pop('changed_data_versions', None)
+    session.info.pop('bumped_data_versions', None)
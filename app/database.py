@@ -0,0 +1,31 @@
+from sqlalchemy import event
+
+from app import db
+
+
+def _sqlite_pragmas(config):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}")
+        cursor.execute(f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}")
+        cursor.execute(f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}")
+        cursor.close()
+
+    return set_pragmas
+
+
+# ---------------- SQLite concurrency mode ------------------
+# Applies the WAL, busy_timeout, synchronous and mmap_size pragmas to every new
+# connection of a file-backed SQLite database. Other databases are left alone.
+def init_engine(app):
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite' or not app.config['SQLITE_CONCURRENCY_MODE']:
+        return
+    if engine.url.database in (None, '', ':memory:'):
+        return
+    if app.config['SQLITE_SYNCHRONOUS'].upper() not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+        raise ValueError(f"Unknown SQLITE_SYNCHRONOUS mode: {app.config['SQLITE_SYNCHRONOUS']}")
+
+    event.listen(engine, 'connect', _sqlite_pragmas(app.config))
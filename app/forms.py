@@ -1,8 +1,9 @@
 from flask_wtf import FlaskForm
 from wtforms import (
-    StringField, PasswordField, BooleanField, SubmitField, HiddenField,
+    StringField, PasswordField, BooleanField, SubmitField, HiddenField, IntegerField,
     SelectField, DateField, TextAreaField, FieldList, FormField
 )
+from wtforms.widgets import HiddenInput
 from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
 from app.models import User, Department
 from flask_login import current_user
@@ -30,9 +31,11 @@ class LeaveRequestForm(FlaskForm):
         self.teacher_id.data = current_user.id
 
 
-# Slot Form: Stores slot ID and selected covering teacher
+# Slot Form: Stores slot ID, occurrence date and selected covering teacher
 class SlotForm(FlaskForm):
-    slot_id = HiddenField('Slot ID')  # Hidden field to store the slot ID
+    # Hidden, but typed and required so tampered or stale rows fail validation instead of the save
+    slot_id = IntegerField('Slot ID', widget=HiddenInput(), validators=[DataRequired()])
+    date = DateField('Date', format='%Y-%m-%d', widget=HiddenInput(), validators=[DataRequired()])
     covering_teacher = SelectField('Select Cover Teacher', coerce=int, validators=[DataRequired()])
 
 
@@ -43,7 +46,7 @@ class CoverAssignmentForm(FlaskForm):
 
     def set_slot_choices(self, slot_teacher_mapping):
         for slot_form in self.slots:
-            slot_id = int(slot_form.slot_id.data)
+            slot_id = slot_form.slot_id.data
             if slot_id in slot_teacher_mapping:
                 teachers = slot_teacher_mapping[slot_id]
                 slot_form.covering_teacher.choices = [
@@ -52,6 +55,13 @@ class CoverAssignmentForm(FlaskForm):
             else:
                 slot_form.covering_teacher.choices = []
 
+    # Preselect covering teachers from an automatic assignment keyed by (slot_id, date)
+    def prefill(self, assignment):
+        for slot_form in self.slots:
+            key = (slot_form.slot_id.data, slot_form.date.data)
+            if key in assignment:
+                slot_form.covering_teacher.data = assignment[key]
+
 # Sign Up Form
 class SignupForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email(), Length(min=6, max=120)])
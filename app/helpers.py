@@ -1,7 +1,14 @@
-from datetime import timedelta, datetime
-from app.models import User, TeachingSlot, LeaveRequest, CoverAssignment
+from collections import defaultdict, namedtuple
+from datetime import date, timedelta, datetime
+from flask import abort
+from app.models import User, TeachingSlot, LeaveRequest, LeaveRequestSlot, CoverAssignment
 from app import db
-from app.forms import SlotForm
+from sqlalchemy import or_, tuple_
+from sqlalchemy.orm import joinedload
+from app.timetable_index import timetable_index
+from app.workload import record_cover_workload
+from app.analytics import record_cover_stats
+from app.data_version import COVER_ASSIGNMENTS, bump_data_version, teacher_versions
 
 
 def get_all_teachers():
@@ -9,7 +16,11 @@ def get_all_teachers():
 
 
 def get_leave_request(request_id):
-    return LeaveRequest.query.get_or_404(request_id)
+    # The selected slots are joined in, as every cover path reads them
+    leave_request = db.session.get(LeaveRequest, request_id, options=[joinedload(LeaveRequest.selected_slots)])
+    if leave_request is None:
+        abort(404)
+    return leave_request
 
 
 def date_range(start_date, end_date):
@@ -17,99 +28,293 @@ def date_range(start_date, end_date):
     return [start_date + timedelta(days=i) for i in range(delta.days + 1)]
 
 
+# One dated lesson of a weekly teaching slot. Plain immutable records, so
+# expanding a date range never writes onto live TeachingSlot rows.
+SlotOccurrence = namedtuple('SlotOccurrence', [
+    'slot_id', 'date', 'day_of_week', 'period_number', 'subject', 'year_group'
+])
+
+
 def get_teaching_slots_by_date_range(teacher_id, start_date, end_date):
-    teaching_slots_with_dates = []
+    return get_teaching_slots_for_teachers([teacher_id], start_date, end_date)[teacher_id]
+
+
+# Expands the weekly timetables of several teachers over a date range,
+# returning {teacher_id: [SlotOccurrence, ...]} in date order. Served from the
+# timetable snapshot, or with a single query when the snapshot is too large to
+# hold every slot.
+def get_teaching_slots_for_teachers(teacher_ids, start_date, end_date):
     date_range_list = date_range(start_date, end_date)
 
+    snapshot = timetable_index.snapshot()
+    if snapshot.complete:
+        occurrences = {teacher_id: [] for teacher_id in teacher_ids}
+        for single_date in date_range_list:
+            for teacher_id in teacher_ids:
+                occurrences[teacher_id].extend(
+                    SlotOccurrence(slot_id, single_date, day_of_week, period_number, subject, year_group)
+                    for slot_id, day_of_week, period_number, subject, year_group
+                    in snapshot.slots_on(teacher_id, single_date.weekday())
+                )
+        return occurrences
+
+    weekly_slots = db.session.execute(
+        db.select(TeachingSlot)
+        .options(joinedload(TeachingSlot.lesson))
+        .where(
+            TeachingSlot.teacher_id.in_(teacher_ids),
+            TeachingSlot.day_of_week.in_({single_date.weekday() for single_date in date_range_list})
+        )
+        .order_by(TeachingSlot.id)
+    ).scalars().all()
+
+    slots_by_day = defaultdict(list)
+    for slot in weekly_slots:
+        slots_by_day[slot.day_of_week].append(slot)
+
+    occurrences = {teacher_id: [] for teacher_id in teacher_ids}
     for single_date in date_range_list:
-        day_of_week = single_date.weekday()
+        for slot in slots_by_day[single_date.weekday()]:
+            occurrences[slot.teacher_id].append(SlotOccurrence(
+                slot_id=slot.id,
+                date=single_date,
+                day_of_week=slot.day_of_week,
+                period_number=slot.period_number,
+                subject=slot.lesson.subject,
+                year_group=slot.lesson.year_group
+            ))
+
+    return occurrences
+
+
+# ---------------- Partial-day leave ------------------
+# The lessons a leave request takes the teacher away from: every lesson in
+# its range, or only the selected ones when the teacher picked periods.
+def get_leave_teaching_slots(leave_request):
+    teaching_slots = get_teaching_slots_by_date_range(
+        leave_request.user_id, leave_request.start_date, leave_request.end_date
+    )
+    if leave_request.id is None:
+        return teaching_slots
+    selected = {(slot.teaching_slot_id, slot.date) for slot in leave_request.selected_slots}
+    if not selected:
+        return teaching_slots
+    return [slot for slot in teaching_slots if (slot.slot_id, slot.date) in selected]
 
-        daily_teaching_slots = TeachingSlot.query.filter_by(
-            teacher_id=teacher_id,
-            day_of_week=day_of_week
-        ).all()
 
-        for slot in daily_teaching_slots:
-            slot.date = single_date
-            slot.subject = slot.lesson.subject
-            slot.year_group = slot.lesson.year_group
-            teaching_slots_with_dates.append(slot)
+# selections: 'slot_id:YYYY-MM-DD' strings from the leave form. Only lessons
+# the teacher really teaches in the range are kept; picking none or all of
+# them leaves the request as a whole-day absence. Returns the slots linked.
+def set_leave_slots(leave_request, selections):
+    teaching_slots = get_teaching_slots_by_date_range(
+        leave_request.user_id, leave_request.start_date, leave_request.end_date
+    )
+    wanted = set()
+    for selection in selections:
+        slot_id, _, day = selection.partition(':')
+        try:
+            wanted.add((int(slot_id), date.fromisoformat(day)))
+        except ValueError:
+            continue
 
-    return teaching_slots_with_dates
+    chosen = [slot for slot in teaching_slots if (slot.slot_id, slot.date) in wanted]
+    if len(chosen) == len(teaching_slots):
+        chosen = []
+    leave_request.selected_slots = [
+        LeaveRequestSlot(teaching_slot_id=slot.slot_id, date=slot.date, period_number=slot.period_number)
+        for slot in chosen
+    ]
+    return chosen
 
 
-def get_available_teachers_for_slot(slot, all_teachers, leave_request):
-    available_teachers = []
+# ---------------- Absences and live covers ------------------
+# Who is unavailable on each date in a range regardless of the timetable:
+# teachers on approved whole-day leave, and teachers busy in a given period,
+# either covering a lesson or away for it on partial-day leave.
+def get_unavailable_teachers(start_date, end_date):
+    on_leave = defaultdict(set)
+    covering = defaultdict(set)
 
-    for teacher in all_teachers:
-        if teacher.id == leave_request.requesting_user.id:
+    # One row per whole-day leave, or per selected lesson of a partial-day one
+    leave_rows = db.session.execute(
+        db.select(LeaveRequest.user_id, LeaveRequest.start_date, LeaveRequest.end_date,
+                  LeaveRequestSlot.date, LeaveRequestSlot.period_number)
+        .outerjoin(LeaveRequestSlot, LeaveRequestSlot.leave_request_id == LeaveRequest.id)
+        .where(
+            LeaveRequest.status == 'approved',
+            LeaveRequest.start_date <= end_date,
+            LeaveRequest.end_date >= start_date
+        )
+    ).all()
+    for user_id, leave_start, leave_end, slot_date, period_number in leave_rows:
+        if slot_date is not None:
+            if start_date <= slot_date <= end_date:
+                covering[(slot_date, period_number)].add(user_id)
             continue
+        for day in date_range(max(leave_start, start_date), min(leave_end, end_date)):
+            on_leave[day].add(user_id)
 
-        conflicting_slot = TeachingSlot.query.filter_by(
-            teacher_id=teacher.id,
-            day_of_week=slot.day_of_week,
-            period_number=slot.period_number
-        ).first()
+    cover_rows = db.session.execute(
+        db.select(CoverAssignment.covering_teacher_id, CoverAssignment.date, CoverAssignment.period_number)
+        .where(CoverAssignment.date >= start_date, CoverAssignment.date <= end_date)
+    ).all()
+    for covering_teacher_id, day, period_number in cover_rows:
+        covering[(day, period_number)].add(covering_teacher_id)
 
-        if not conflicting_slot:
-            available_teachers.append(teacher)
+    return on_leave, covering
 
-    return available_teachers
 
+def get_available_teachers_for_slot(slot, all_teachers, leave_request):
+    free_teacher_ids = set(timetable_index.free_teachers(
+        [teacher.id for teacher in all_teachers],
+        slot.day_of_week,
+        slot.period_number
+    ))
 
-def get_slot_teacher_mapping(leave_request):
-    teaching_slots = get_teaching_slots_by_date_range(
-        leave_request.requesting_user.id,
-        leave_request.start_date,
-        leave_request.end_date
-    )
+    return [
+        teacher for teacher in all_teachers
+        if teacher.id in free_teacher_ids and teacher.id != leave_request.user_id
+    ]
+
+
+def get_slot_teacher_mapping(leave_request, teaching_slots=None):
+    if teaching_slots is None:
+        teaching_slots = get_leave_teaching_slots(leave_request)
     all_teachers = get_all_teachers()
+    on_leave, covering = get_unavailable_teachers(leave_request.start_date, leave_request.end_date)
     slot_teacher_mapping = {}
 
     for slot in teaching_slots:
-        available_teachers = get_available_teachers_for_slot(slot, all_teachers, leave_request)
-        slot_teacher_mapping[slot.id] = [
+        unavailable = on_leave[slot.date] | covering[(slot.date, slot.period_number)]
+        available_teachers = [
             {
                 "id": teacher.id,
                 "name": teacher.full_name
             }
-            for teacher in available_teachers
+            for teacher in get_available_teachers_for_slot(slot, all_teachers, leave_request)
+            if teacher.id not in unavailable
         ]
 
+        # A weekly slot can occur several times in the range; keep teachers free on every occurrence
+        if slot.slot_id in slot_teacher_mapping:
+            free_ids = {teacher["id"] for teacher in available_teachers}
+            available_teachers = [
+                teacher for teacher in slot_teacher_mapping[slot.slot_id] if teacher["id"] in free_ids
+            ]
+        slot_teacher_mapping[slot.slot_id] = available_teachers
+
     return slot_teacher_mapping
 
 
-def populate_slot_forms(form, slot_teacher_mapping):
-    for slot_id, teachers in slot_teacher_mapping.items():
-        slot_form = SlotForm()
-        slot_form.slot_id.data = slot_id
-        slot_form.covering_teacher.choices = [(teacher['id'], teacher['name']) for teacher in teachers]
-        form.slots.append_entry(slot_form)
+def populate_slot_forms(form, teaching_slots, slot_teacher_mapping):
+    # One form row per dated occurrence; on POST the rows come back from the submitted data
+    if not form.slots.entries:
+        for slot in teaching_slots:
+            form.slots.append_entry({'slot_id': slot.slot_id, 'date': slot.date})
+    form.set_slot_choices(slot_teacher_mapping)
 
 
 def get_slot_details(teaching_slots, slot_teacher_mapping):
     return [
         {
-            'subject': slot.lesson.subject,
-            'year_group': slot.lesson.year_group,
+            'subject': slot.subject,
+            'year_group': slot.year_group,
             'date': slot.date,
             'period_number': slot.period_number
         }
-        for slot in teaching_slots if slot.id in slot_teacher_mapping
+        for slot in teaching_slots if slot.slot_id in slot_teacher_mapping
     ]
 
 
-def save_cover_assignments(form, leave_request):
-    for slot_form in form.slots:
-        slot_id = slot_form.slot_id.data
-        covering_teacher_id = slot_form.covering_teacher.data
+# ---------------- Conflict-checked bulk insert ------------------
+# rows: dicts with absent_teacher_id, covering_teacher_id, teaching_slot_id,
+# date and period_number. The whole batch is checked in memory and against
+# existing assignments with one query; nothing is written if any row clashes.
+# Returns {row_index: message} for the clashing rows. The caller commits.
+def insert_cover_assignments(rows):
+    conflicts = {}
+    slot_dates = {}
+    teacher_periods = {}
+    for index, row in enumerate(rows):
+        slot_key = (row['teaching_slot_id'], row['date'])
+        teacher_key = (row['covering_teacher_id'], row['date'], row['period_number'])
+
+        if slot_key in slot_dates:
+            conflicts[index] = 'This lesson is already being covered in this batch.'
+        elif teacher_key in teacher_periods:
+            conflicts[index] = 'This teacher is already covering another class in this period.'
+        elif not timetable_index.is_free(row['covering_teacher_id'], row['date'].weekday(), row['period_number']):
+            conflicts[index] = 'This teacher is teaching their own class in this period.'
+        slot_dates.setdefault(slot_key, index)
+        teacher_periods.setdefault(teacher_key, index)
+
+    if rows:
+        existing = db.session.execute(
+            db.select(
+                CoverAssignment.teaching_slot_id,
+                CoverAssignment.covering_teacher_id,
+                CoverAssignment.date,
+                CoverAssignment.period_number
+            ).where(or_(
+                tuple_(CoverAssignment.teaching_slot_id, CoverAssignment.date).in_(list(slot_dates)),
+                tuple_(
+                    CoverAssignment.covering_teacher_id, CoverAssignment.date, CoverAssignment.period_number
+                ).in_(list(teacher_periods))
+            ))
+        ).all()
+        for teaching_slot_id, covering_teacher_id, day, period_number in existing:
+            if (teaching_slot_id, day) in slot_dates:
+                conflicts.setdefault(slot_dates[(teaching_slot_id, day)], 'This lesson already has cover assigned.')
+            if (covering_teacher_id, day, period_number) in teacher_periods:
+                conflicts.setdefault(teacher_periods[(covering_teacher_id, day, period_number)],
+                                     'This teacher is already covering another class in this period.')
+
+    if conflicts or not rows:
+        return conflicts
+
+    db.session.execute(db.insert(CoverAssignment), rows)
+    record_cover_workload((row['covering_teacher_id'], row['date']) for row in rows)
+    record_cover_stats((row['absent_teacher_id'], row['covering_teacher_id'], row['date']) for row in rows)
+    # Bulk inserts skip the ORM events
+    bump_data_version(COVER_ASSIGNMENTS, *teacher_versions(
+        [row['absent_teacher_id'] for row in rows] + [row['covering_teacher_id'] for row in rows]
+    ))
+    return conflicts
+
+
+# Shown against a form row whose hidden slot and date are not one of the leave's lessons
+UNREADABLE_LESSON = 'This lesson could not be read. Reload the page and try again.'
+
+
+def save_cover_assignments(form, leave_request, teaching_slots=None):
+    if teaching_slots is None:
+        teaching_slots = get_leave_teaching_slots(leave_request)
+    # Only this leave's own lessons can be covered: the absent teacher's slots,
+    # on their weekday, inside the range (and selected, for partial-day leave)
+    periods = {(slot.slot_id, slot.date): slot.period_number for slot in teaching_slots}
+    slot_forms = [slot_form for slot_form in form.slots if slot_form.covering_teacher.data]
+
+    # A stale or edited row (e.g. a lesson deleted since the page was loaded) is reported against it
+    unreadable = {slot_form: UNREADABLE_LESSON for slot_form in slot_forms
+                  if (slot_form.slot_id.data, slot_form.date.data) not in periods}
+    if unreadable:
+        return unreadable
+
+    rows = [
+        {
+            'absent_teacher_id': leave_request.user_id,
+            'covering_teacher_id': slot_form.covering_teacher.data,
+            'teaching_slot_id': slot_form.slot_id.data,
+            'date': slot_form.date.data,
+            'period_number': periods[(slot_form.slot_id.data, slot_form.date.data)]
+        }
+        for slot_form in slot_forms
+    ]
 
-        if covering_teacher_id:
-            cover_assignment = CoverAssignment(
-                absent_teacher_id=leave_request.requesting_user.id,
-                covering_teacher_id=covering_teacher_id,
-                teaching_slot_id=slot_id
-            )
-            db.session.add(cover_assignment)
+    conflicts = insert_cover_assignments(rows)
+    if conflicts:
+        db.session.rollback()
+        return {slot_forms[index]: message for index, message in conflicts.items()}
 
     db.session.commit()
+    return {}
@@ -0,0 +1,130 @@
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+from app import db
+from app.user_cache import get_user_cache
+from app.dashboard import get_dashboard_cache
+
+TOP_STATEMENTS = 5  # Statement shapes reported per request
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),  # string literals
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),  # numbers
+    (re.compile(r'%\(\w+\)s|:\w+|\$\d+|%s'), '?'),  # driver placeholders
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?...)'),  # expanded IN lists of any length
+    (re.compile(r'__\[POSTCOMPILE_\w+\]'), '(?...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def normalise_statement(statement):
+    # Statements that differ only in their parameters share one shape
+    for pattern, replacement in _LITERALS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class RequestQueries:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = defaultdict(lambda: [0, 0.0])  # shape -> [count, seconds]
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        shape = self.shapes[normalise_statement(statement)]
+        shape[0] += 1
+        shape[1] += seconds
+
+    def top(self, limit=TOP_STATEMENTS):
+        return sorted(self.shapes.items(), key=lambda item: (-item[1][0], -item[1][1]))[:limit]
+
+
+# ---------------- Engine hooks ------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    if has_request_context() and 'sql_queries' in g:
+        g.sql_queries.record(statement, time.perf_counter() - started)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get('query_started') if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+# ---------------- Request hooks ------------------
+def _start_request():
+    g.sql_queries = RequestQueries()
+
+
+def _finish_request(app):
+    def finish_request(response):
+        queries = g.pop('sql_queries', None)
+        if queries is None:
+            return response
+
+        db_ms = round(queries.seconds * 1000, 3)
+        response.headers.add('Server-Timing', f'db;dur={db_ms};desc="{queries.count} queries"')
+
+        app.logger.info(json.dumps({
+            'event': 'sql_request',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'queries': queries.count,
+            'db_ms': db_ms,
+            'user_cache': get_user_cache().stats(),
+            'dashboard_cache': get_dashboard_cache().stats(),
+            'top_statements': [
+                {'statement': shape, 'count': count, 'ms': round(seconds * 1000, 3)}
+                for shape, (count, seconds) in queries.top()
+            ]
+        }))
+
+        # The same shape again and again in one request is almost always a lazy load inside a loop
+        threshold = app.config['SQL_REPEAT_WARNING']
+        for shape, (count, seconds) in queries.shapes.items():
+            if count > threshold:
+                app.logger.warning(json.dumps({
+                    'event': 'sql_repeated_statement',
+                    'method': request.method,
+                    'path': request.path,
+                    'endpoint': request.endpoint,
+                    'count': count,
+                    'ms': round(seconds * 1000, 3),
+                    'statement': shape
+                }))
+        return response
+
+    return finish_request
+
+
+# ---------------- Opt-in ------------------
+# Enabled with SQL_INSTRUMENTATION=1. Adds a Server-Timing header with the
+# request's query count and database time, logs one JSON line per request
+# and warns when one statement shape runs more than SQL_REPEAT_WARNING times.
+def init_sql_instrumentation(app):
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request(app))
+    if app.logger.level == logging.NOTSET:
+        app.logger.setLevel(logging.INFO)
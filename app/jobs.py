@@ -0,0 +1,381 @@
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import date, datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ('succeeded', 'failed')
+PROGRESS_INTERVAL = 1.0  # Seconds between progress writes from one job
+PRUNE_INTERVAL = 3600  # Seconds between sweeps of old finished jobs
+
+JOBS = {}  # kind -> (handler, max_attempts)
+
+
+class JobFailed(Exception):
+    # Raised by a handler for failures a retry cannot fix, e.g. a deleted leave request
+    pass
+
+
+def job_handler(kind, max_attempts=3):
+    def register(handler):
+        JOBS[kind] = (handler, max_attempts)
+        return handler
+    return register
+
+
+def _now():
+    # Naive UTC, as stored in the job table
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _params_json(params):
+    return json.dumps(params, sort_keys=True, default=lambda value: value.isoformat())
+
+
+# ---------------- Queueing ------------------
+# Adds the job to the caller's transaction; it becomes visible to workers when
+# the caller commits. An identical job (same kind and params) that is still
+# queued or running is returned instead, so repeated clicks share one job.
+def find_job(kind, params=None):
+    # The queued or running job with this kind and params, if any; read-only
+    return db.session.execute(
+        db.select(Job).where(Job.kind == kind, Job.params == _params_json(params or {}),
+                             Job.status.in_(('queued', 'running')))
+        .order_by(Job.id).limit(1)
+    ).scalar()
+
+
+def enqueue_job(kind, params=None, user_id=None):
+    if kind not in JOBS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    job = find_job(kind, params)
+    if job is not None:
+        return job
+
+    now = _now()
+    job = Job(kind=kind, params=_params_json(params or {}), status='queued', created_by=user_id, attempts=0,
+              max_attempts=JOBS[kind][1], run_after=now, created_at=now, progress=0)
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+
+def job_result(job):
+    return json.loads(job.result) if job.result else None
+
+
+def job_params(job):
+    return json.loads(job.params)
+
+
+def job_status(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "done": job.status in FINISHED,
+        "progress": job.progress,
+        "total": job.progress_total,
+        "message": job.message,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "error": job.error,
+        "result": job_result(job) if job.status == 'succeeded' else None,
+        "created_at": job.created_at.isoformat() + 'Z',
+        "finished_at": job.finished_at.isoformat() + 'Z' if job.finished_at else None,
+    }
+
+
+def result_path(job):
+    result = job_result(job) or {}
+    if job.status != 'succeeded' or not result.get('file'):
+        return None
+    return os.path.join(current_app.config['JOB_RESULT_DIR'], result['file'])
+
+
+# ---------------- Claiming ------------------
+# A job can be claimed when it is queued and due, or when it is running but
+# its worker has stopped sending heartbeats. Claimed jobs are marked running
+# under a fresh token in one short transaction, and the token guards every
+# later write, so a job reclaimed from a dead worker cannot be finished twice.
+#  - Postgres: the candidates are locked with SELECT ... FOR UPDATE SKIP LOCKED,
+#    so concurrent workers pass over each other's rows instead of waiting.
+#  - SQLite: the candidates are picked by a subquery inside the claiming
+#    UPDATE, which runs under SQLite's single write lock, so no two workers
+#    can mark the same row.
+def _claimable(now, stale_before):
+    return or_(
+        and_(Job.status == 'queued', Job.run_after <= now),
+        and_(Job.status == 'running', Job.heartbeat_at < stale_before),
+    )
+
+
+def claim_jobs(worker_id, limit):
+    now = _now()
+    stale_before = now - timedelta(seconds=current_app.config['JOB_LEASE_SECONDS'])
+    token = f'{worker_id}/{uuid.uuid4().hex[:12]}'
+    candidates = db.select(Job.id).where(_claimable(now, stale_before)).order_by(Job.run_after, Job.id).limit(limit)
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        ids = db.session.execute(candidates.with_for_update(skip_locked=True)).scalars().all()
+        if not ids:
+            db.session.rollback()
+            return []
+        claimed = Job.id.in_(ids)
+    else:
+        claimed = and_(Job.id.in_(candidates.scalar_subquery()), _claimable(now, stale_before))
+
+    db.session.execute(
+        db.update(Job).where(claimed)
+        .values(status='running', claimed_by=token, heartbeat_at=now, attempts=Job.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    ids = db.session.execute(db.select(Job.id).where(Job.claimed_by == token).order_by(Job.id)).scalars().all()
+    return [(job_id, token) for job_id in ids]
+
+
+def _heartbeat(tokens):
+    if not tokens:
+        return
+    try:
+        db.session.execute(
+            db.update(Job).where(Job.claimed_by.in_(tokens), Job.status == 'running')
+            .values(heartbeat_at=_now()).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    except OperationalError:
+        # SQLite busy with a long job's write; the next poll tries again
+        db.session.rollback()
+
+
+# ---------------- Running ------------------
+class JobContext:
+    # Handed to each handler for reporting progress. Progress is written on its
+    # own short transaction (at most once a second unless finished), so call it
+    # between the handler's own writes rather than inside an open one.
+    def __init__(self, job):
+        self.job_id = job.id
+        self.token = job.claimed_by
+        self.attempt = job.attempts
+        self._last_write = 0.0
+
+    def progress(self, done, total=None, message=None):
+        now = time.monotonic()
+        if now - self._last_write < PROGRESS_INTERVAL and (total is None or done < total):
+            return
+        self._last_write = now
+        values = {'progress': done, 'heartbeat_at': _now()}
+        if total is not None:
+            values['progress_total'] = total
+        if message is not None:
+            values['message'] = message[:255]
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(
+                    db.update(Job.__table__).where(Job.__table__.c.id == self.job_id,
+                                                   Job.__table__.c.claimed_by == self.token).values(**values)
+                )
+        except OperationalError:
+            logger.warning('Could not record progress for job %s', self.job_id)
+
+
+def _finish(job_id, token, **values):
+    db.session.execute(
+        db.update(Job).where(Job.id == job_id, Job.claimed_by == token)
+        .values(**values).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def _retry_delay(attempts):
+    config = current_app.config
+    return min(config['JOB_RETRY_DELAY'] * 2 ** max(attempts - 1, 0), config['JOB_RETRY_MAX_DELAY'])
+
+
+def run_job(job_id, token):
+    job = db.session.get(Job, job_id)
+    if job is None or job.claimed_by != token or job.status != 'running':
+        return
+
+    handler, _max_attempts = JOBS.get(job.kind, (None, None))
+    if handler is None:
+        error = JobFailed(f'Unknown job kind: {job.kind}')
+    elif job.attempts > job.max_attempts:
+        error = JobFailed('The worker stopped while running this job too many times.')
+    else:
+        context = JobContext(job)
+        params = job_params(job)
+        try:
+            result = handler(context, **params)
+        except Exception as raised:
+            db.session.rollback()
+            error = raised
+        else:
+            _finish(job_id, token, status='succeeded', result=json.dumps(result), error=None,
+                    finished_at=_now(), claimed_by=None)
+            return
+
+    message = str(error) or error.__class__.__name__
+    if isinstance(error, JobFailed) or job.attempts >= job.max_attempts:
+        if not isinstance(error, JobFailed):
+            logger.exception('Job %s (%s) failed', job_id, job.kind, exc_info=error)
+        _finish(job_id, token, status='failed', error=message, finished_at=_now(), claimed_by=None)
+    else:
+        logger.warning('Job %s (%s) attempt %s failed: %s', job_id, job.kind, job.attempts, message)
+        _finish(job_id, token, status='queued', error=message, claimed_by=None,
+                run_after=_now() + timedelta(seconds=_retry_delay(job.attempts)))
+
+
+def _run_in_context(app, job_id, token):
+    with app.app_context():
+        try:
+            run_job(job_id, token)
+        except Exception:
+            logger.exception('Job %s could not be recorded', job_id)
+
+
+def prune_jobs(retention_days=None):
+    # Deletes finished jobs, and their result files, older than the retention period
+    retention_days = current_app.config['JOB_RETENTION_DAYS'] if retention_days is None else retention_days
+    cutoff = _now() - timedelta(days=retention_days)
+    old = db.session.execute(
+        db.select(Job).where(Job.status.in_(FINISHED), Job.finished_at < cutoff)
+    ).scalars().all()
+    for job in old:
+        path = result_path(job)
+        if path and os.path.exists(path):
+            os.remove(path)
+        db.session.delete(job)
+    db.session.commit()
+    return len(old)
+
+
+# ---------------- Worker ------------------
+# Claims due jobs up to the number of free threads and runs each in its own
+# app context (and so its own session and connection). The main loop sends
+# heartbeats for the jobs it is running and sleeps on the queue otherwise.
+# SIGTERM or Ctrl-C stops claiming and waits for running jobs to finish;
+# burst mode exits once the queue is empty.
+def run_worker(threads=None, poll_interval=None, burst=False):
+    app = current_app._get_current_object()
+    threads = threads or app.config['JOB_WORKER_THREADS']
+    poll_interval = app.config['JOB_POLL_INTERVAL'] if poll_interval is None else poll_interval
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    os.makedirs(app.config['JOB_RESULT_DIR'], exist_ok=True)
+
+    stopping = threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        def stop(signum, frame):
+            logger.info('Worker %s stopping after its running jobs', worker_id)
+            stopping.set()
+            signal.signal(signum, signal.SIG_DFL)  # A second signal stops at once
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+    running = {}  # future -> claim token
+    last_prune = 0.0
+    with ThreadPoolExecutor(threads, thread_name_prefix='job') as pool:
+        while not stopping.is_set():
+            for future in [future for future in running if future.done()]:
+                del running[future]
+
+            try:
+                claimed = claim_jobs(worker_id, threads - len(running)) if len(running) < threads else []
+            except OperationalError:
+                # SQLite busy with a long job's write; try again on the next poll
+                db.session.rollback()
+                claimed = []
+            for job_id, token in claimed:
+                running[pool.submit(_run_in_context, app, job_id, token)] = token
+            _heartbeat(list(running.values()))
+
+            if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                prune_jobs()
+                last_prune = time.monotonic()
+            db.session.close()
+
+            if burst and not running and not claimed:
+                break
+            if claimed and len(running) < threads:
+                continue
+            if running:
+                wait(list(running), timeout=poll_interval, return_when=FIRST_COMPLETED)
+            else:
+                stopping.wait(poll_interval)
+
+
+# ---------------- Job handlers ------------------
+# Each takes the JobContext plus the JSON params it was queued with, and
+# returns a JSON-ready result. The heavy modules are imported when they run.
+@job_handler('auto_assign')
+def auto_assign_job(context, leave_request_id):
+    from app.availability import get_available_teacher_mapping
+    from app.cover_solver import auto_assign_cover, auto_assign_summary
+    from app.helpers import get_leave_teaching_slots
+    from app.models import LeaveRequest
+
+    leave_request = db.session.get(LeaveRequest, leave_request_id)
+    if leave_request is None:
+        raise JobFailed(f'Leave request {leave_request_id} no longer exists.')
+
+    context.progress(0, 3, 'Finding the lessons to cover')
+    teaching_slots = get_leave_teaching_slots(leave_request)
+    context.progress(1, 3, f'Checking who is free for {len(teaching_slots)} lessons')
+    slot_teacher_mapping = get_available_teacher_mapping(leave_request, teaching_slots)
+    context.progress(2, 3, 'Balancing cover across teachers')
+    assignment = auto_assign_cover(leave_request, teaching_slots, slot_teacher_mapping)
+    summary = auto_assign_summary(teaching_slots, slot_teacher_mapping, assignment)
+    context.progress(3, 3, f"{len(summary['assignments'])} lessons assigned, {len(summary['unfilled'])} unfilled")
+    return summary
+
+
+@job_handler('export_report')
+def export_report_job(context, report, start_date=None, end_date=None):
+    from app.reports import REPORTS, CHUNK_ROWS, count_report_rows, generate_csv, report_filename
+
+    if report not in REPORTS:
+        raise JobFailed(f'Unknown report: {report}')
+    start_date = date.fromisoformat(start_date) if start_date else None
+    end_date = date.fromisoformat(end_date) if end_date else None
+
+    total = count_report_rows(report, start_date, end_date)
+    context.progress(0, total, f'Exporting {total} rows')
+    filename = f'job-{context.job_id}-{report_filename(report, start_date, end_date)}'
+    path = os.path.join(current_app.config['JOB_RESULT_DIR'], filename)
+    partial = f'{path}.part'
+    try:
+        with open(partial, 'w', encoding='utf-8', newline='') as output:
+            for chunk_number, chunk in enumerate(generate_csv(report, start_date, end_date)):
+                output.write(chunk)
+                context.progress(min(chunk_number * CHUNK_ROWS, total), total)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    context.progress(total, total, f'Exported {total} rows')
+    return {'file': filename, 'download_name': report_filename(report, start_date, end_date), 'rows': total}
+
+
+@job_handler('rebuild_analytics', max_attempts=2)
+def rebuild_analytics_job(context):
+    from app.analytics import rebuild_analytics
+
+    context.progress(0, 1, 'Recounting absence and cover history')
+    absence_rows, cover_rows = rebuild_analytics()
+    context.progress(1, 1, f'Rebuilt {absence_rows} absence and {cover_rows} cover rollup rows')
+    return {'absence_rows': absence_rows, 'cover_rows': cover_rows}
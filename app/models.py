@@ -88,6 +88,11 @@ class TeachingSlot(db.Model):
     teacher = db.relationship('User', back_populates='teaching_slots')
     leave_request = db.relationship('LeaveRequest', back_populates='teaching_slots')
 
+    __table_args__ = (
+        db.Index('ix_teaching_slot_teacher_day_period', 'teacher_id', 'day_of_week', 'period_number'),
+        db.Index('ix_teaching_slot_day_period', 'day_of_week', 'period_number', 'teacher_id'),
+    )
+
 
 # ---------------- LeaveRequest Model ------------------
 class LeaveRequest(db.Model):
@@ -102,6 +107,13 @@ class LeaveRequest(db.Model):
 
     requesting_user = db.relationship('User', back_populates='leave_requests')
     teaching_slots = db.relationship('TeachingSlot', back_populates='leave_request', lazy=True)
+    selected_slots = db.relationship('LeaveRequestSlot', back_populates='leave_request', lazy=True,
+                                     cascade='all, delete-orphan', passive_deletes=True)
+
+    __table_args__ = (
+        db.Index('ix_leave_request_status', 'status', 'start_date', 'end_date', 'user_id'),
+        db.Index('ix_leave_request_user_dates', 'user_id', 'start_date', 'end_date'),
+    )
 
 
 # ---------------- CoverAssignment Model ------------------
@@ -111,9 +123,132 @@ class CoverAssignment(db.Model):
     absent_teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     covering_teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     teaching_slot_id = db.Column(db.Integer, db.ForeignKey('teaching_slot.id'), nullable=False)
+    date = db.Column(db.Date, nullable=True)  # The dated occurrence of the weekly slot being covered
+    period_number = db.Column(db.Integer, nullable=True)  # Copied from the slot so clashes are index lookups
 
     absent_teacher = db.relationship('User', foreign_keys=[absent_teacher_id], backref='absences')
     covering_teacher = db.relationship('User', foreign_keys=[covering_teacher_id], backref='covers')
     teaching_slot = db.relationship('TeachingSlot', backref='cover_assignment')
 
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    __table_args__ = (
+        db.UniqueConstraint('teaching_slot_id', 'date', name='uq_cover_assignment_slot_date'),
+        db.UniqueConstraint('covering_teacher_id', 'date', 'period_number', name='uq_cover_assignment_teacher_period'),
+        db.Index('ix_cover_assignment_date_period', 'date', 'period_number', 'covering_teacher_id'),
+        db.Index('ix_cover_assignment_absent_teacher', 'absent_teacher_id', 'date'),
+    )
+
+
+# ---------------- CoverWorkload Model ------------------
+# Materialised cover counts per teacher and period bucket ('day', 'week' or
+# 'term', starting on bucket_start), kept in step with cover_assignment.
+class CoverWorkload(db.Model):
+    __tablename__ = 'cover_workload'
+    id = db.Column(db.Integer, primary_key=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    bucket = db.Column(db.String(10), nullable=False)
+    bucket_start = db.Column(db.Date, nullable=False)
+    cover_count = db.Column(db.Integer, nullable=False, default=0)
+
+    teacher = db.relationship('User')
+
+    __table_args__ = (
+        db.UniqueConstraint('teacher_id', 'bucket', 'bucket_start', name='uq_cover_workload_teacher_bucket'),
+    )
+
+
+# ---------------- LeaveRequestSlot Model ------------------
+# The dated lessons a partial-day leave request covers. A leave request with
+# no selected slots is a whole-day absence for every day in its range.
+class LeaveRequestSlot(db.Model):
+    __tablename__ = 'leave_request_slot'
+    id = db.Column(db.Integer, primary_key=True)
+    leave_request_id = db.Column(db.Integer, db.ForeignKey('leave_request.id', ondelete='CASCADE'), nullable=False)
+    teaching_slot_id = db.Column(db.Integer, db.ForeignKey('teaching_slot.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    period_number = db.Column(db.Integer, nullable=False)  # Copied from the slot, as on CoverAssignment
+
+    leave_request = db.relationship('LeaveRequest', back_populates='selected_slots')
+    teaching_slot = db.relationship('TeachingSlot')
+
+    __table_args__ = (
+        db.UniqueConstraint('leave_request_id', 'teaching_slot_id', 'date', name='uq_leave_request_slot'),
+    )
+
+
+# ---------------- Analytics Rollups ------------------
+# Pre-aggregated absence and cover figures per teacher and week/term bucket,
+# kept current alongside every leave and cover write (see app/analytics.py).
+# Department totals group these by the teacher's department.
+class AbsenceRollup(db.Model):
+    __tablename__ = 'absence_rollup'
+    id = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.String(10), nullable=False)  # 'week' or 'term'
+    bucket_start = db.Column(db.Date, nullable=False)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    reason = db.Column(db.String(255), nullable=False, default='')
+    status = db.Column(db.String(50), nullable=False)
+    absence_days = db.Column(db.Integer, nullable=False, default=0)  # School days (Monday to Friday)
+    cover_needed = db.Column(db.Integer, nullable=False, default=0)  # Lessons the absence leaves uncovered
+
+    __table_args__ = (
+        db.UniqueConstraint('bucket', 'bucket_start', 'teacher_id', 'reason', 'status',
+                            name='uq_absence_rollup_bucket_teacher'),
+    )
+
+
+class CoverRollup(db.Model):
+    __tablename__ = 'cover_rollup'
+    id = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.String(10), nullable=False)
+    bucket_start = db.Column(db.Date, nullable=False)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    covers_given = db.Column(db.Integer, nullable=False, default=0)
+    covers_received = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('bucket', 'bucket_start', 'teacher_id', name='uq_cover_rollup_bucket_teacher'),
+    )
+
+
+# ---------------- Job Model ------------------
+# A piece of heavy work queued by a request and run by a `flask worker`
+# process (see app/jobs.py). params and result are JSON text; pages poll the
+# status, progress and message while it runs.
+class Job(db.Model):
+    __tablename__ = 'job'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # e.g. 'auto_assign', 'export_report'
+    params = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'succeeded', 'failed'
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False)  # Not claimed before this (retry backoff)
+    claimed_by = db.Column(db.String(100), nullable=True)  # Claim token of the worker running it
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    progress_total = db.Column(db.Integer, nullable=True)
+    message = db.Column(db.String(255), nullable=True)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+        db.Index('ix_job_claimed_by', 'claimed_by'),
+    )
+
+
+# ---------------- DataVersion Model ------------------
+# One counter per cached data set (e.g. 'timetable'), bumped in the same
+# transaction as any write to it so every process can tell its copy is stale.
+class DataVersion(db.Model):
+    __tablename__ = 'data_version'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,88 @@
+from datetime import date
+
+from flask import request, current_app
+from sqlalchemy import and_, or_
+
+from app import db
+
+CURSOR_SEPARATOR = '_'
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor  # Older rows
+        self.prev_cursor = prev_cursor  # Newer rows
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+# ---------------- Cursors ------------------
+# A cursor is the sort key of the row it points at, e.g. '2025-03-10_412' for
+# (start_date, id). Values are parsed back with the matching column types.
+def encode_cursor(values):
+    return CURSOR_SEPARATOR.join(value.isoformat() if isinstance(value, date) else str(value) for value in values)
+
+
+def decode_cursor(raw, parsers):
+    if not raw:
+        return None
+    parts = raw.split(CURSOR_SEPARATOR)
+    if len(parts) != len(parsers):
+        return None
+    try:
+        return tuple(parse(part) for parse, part in zip(parsers, parts))
+    except ValueError:
+        return None
+
+
+def _seek(columns, values, older):
+    # (c0, c1, ...) < (v0, v1, ...) written out column by column, with a plain
+    # range on the leading column so the database can seek an index on it
+    compare = (lambda column, value: column < value) if older else (lambda column, value: column > value)
+    clauses = []
+    for position, (column, value) in enumerate(zip(columns, values)):
+        equal = [columns[i] == values[i] for i in range(position)]
+        clauses.append(and_(*equal, compare(column, value)))
+    leading = columns[0] <= values[0] if older else columns[0] >= values[0]
+    return and_(leading, or_(*clauses))
+
+
+def page_size():
+    default = current_app.config['LISTING_PAGE_SIZE']
+    return min(max(request.args.get('per_page', default, type=int), 1), current_app.config['LISTING_MAX_PAGE_SIZE'])
+
+
+# ---------------- Keyset pagination ------------------
+# Returns one page of `query`, newest first by `columns` (which must end in a
+# unique column, normally the primary key). `before` fetches the rows after
+# that cursor in display order (older), `after` the rows before it (newer).
+# Every page is one bounded query however much history there is: one extra
+# row is fetched to tell whether another page exists.
+def keyset_page(query, columns, key, before=None, after=None, per_page=50):
+    if after is not None:
+        rows = query.where(_seek(columns, after, older=False)) \
+            .order_by(*[column.asc() for column in columns]).limit(per_page + 1)
+    else:
+        if before is not None:
+            query = query.where(_seek(columns, before, older=True))
+        rows = query.order_by(*[column.desc() for column in columns]).limit(per_page + 1)
+
+    items = db.session.execute(rows).unique().scalars().all()
+    more = len(items) > per_page
+    items = items[:per_page]
+
+    if after is not None:
+        items.reverse()
+        next_cursor = encode_cursor(key(items[-1])) if items else encode_cursor(after)
+        prev_cursor = encode_cursor(key(items[0])) if more and items else None
+    else:
+        next_cursor = encode_cursor(key(items[-1])) if more else None
+        prev_cursor = encode_cursor(key(items[0])) if before is not None and items else None
+    return KeysetPage(items, next_cursor, prev_cursor)
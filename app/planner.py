@@ -0,0 +1,139 @@
+from collections import defaultdict, namedtuple
+
+from app import db
+from app.models import User, LeaveRequest, LeaveRequestSlot, CoverAssignment
+from app.helpers import get_teaching_slots_for_teachers, get_unavailable_teachers, insert_cover_assignments
+from app.cover_solver import load_fairness_costs, solve_cover
+from app.timetable_index import timetable_index
+
+# One slot occurrence that needs cover, and the outcome of planning it
+PlannedCover = namedtuple('PlannedCover', [
+    'slot_id', 'date', 'period_number', 'subject', 'year_group',
+    'absent_teacher_id', 'covering_teacher_id'
+])
+CoverPlan = namedtuple('CoverPlan', ['assigned', 'unfilled'])
+
+
+# ---------------- Whole-school daily cover planner ------------------
+# Plans cover for every approved absence touching the range at once, so that
+# overlapping absences share one availability picture and no covering teacher
+# is booked twice in the same period.
+def plan_cover(start_date, end_date):
+    leave_requests = db.session.execute(
+        db.select(LeaveRequest.id, LeaveRequest.user_id, LeaveRequest.start_date, LeaveRequest.end_date).where(
+            LeaveRequest.status == 'approved',
+            LeaveRequest.start_date <= end_date,
+            LeaveRequest.end_date >= start_date
+        )
+    ).all()
+    if not leave_requests:
+        return CoverPlan([], [])
+
+    absent_teacher_ids = {user_id for _id, user_id, _start, _end in leave_requests}
+    occurrences_by_teacher = get_teaching_slots_for_teachers(absent_teacher_ids, start_date, end_date)
+
+    already_covered = set(db.session.execute(
+        db.select(CoverAssignment.teaching_slot_id, CoverAssignment.date).where(
+            CoverAssignment.absent_teacher_id.in_(absent_teacher_ids),
+            CoverAssignment.date >= start_date,
+            CoverAssignment.date <= end_date
+        )
+    ).all())
+
+    # Partial-day leave only needs cover for the lessons it selected
+    selected = defaultdict(set)
+    for leave_request_id, slot_id, day in db.session.execute(
+        db.select(LeaveRequestSlot.leave_request_id, LeaveRequestSlot.teaching_slot_id, LeaveRequestSlot.date)
+        .where(LeaveRequestSlot.leave_request_id.in_([leave_request_id for leave_request_id, *_rest in leave_requests]))
+    ):
+        selected[leave_request_id].add((slot_id, day))
+
+    # Only the occurrences that fall inside one of the teacher's approved absences
+    needed = {}
+    for leave_request_id, user_id, leave_start, leave_end in leave_requests:
+        for occurrence in occurrences_by_teacher[user_id]:
+            key = (occurrence.slot_id, occurrence.date)
+            if not leave_start <= occurrence.date <= leave_end or key in already_covered:
+                continue
+            if leave_request_id in selected and key not in selected[leave_request_id]:
+                continue
+            needed[key] = (occurrence, user_id)
+    if not needed:
+        return CoverPlan([], [])
+
+    return solve_needed_cover(needed, start_date, end_date)
+
+
+# Solves {(slot_id, date): (occurrence, absent_teacher_id)} against everyone
+# free in that period who is not on leave or already covering elsewhere.
+def solve_needed_cover(needed, start_date, end_date):
+    teacher_ids = db.session.execute(db.select(User.id).filter_by(role='teacher')).scalars().all()
+    on_leave, covering = get_unavailable_teachers(start_date, end_date)
+
+    free_by_period = {}
+    candidates = {}
+    for key, (occurrence, _absent_teacher_id) in needed.items():
+        period_key = (occurrence.day_of_week, occurrence.period_number)
+        if period_key not in free_by_period:
+            free_by_period[period_key] = timetable_index.free_teachers(teacher_ids, *period_key)
+
+        unavailable = on_leave[occurrence.date] | covering[(occurrence.date, occurrence.period_number)]
+        candidates[key] = [teacher_id for teacher_id in free_by_period[period_key] if teacher_id not in unavailable]
+
+    absent_teacher_ids = {absent_teacher_id for _occurrence, absent_teacher_id in needed.values()}
+    costs = load_fairness_costs(set(teacher_ids) | absent_teacher_ids, start_date, end_date)
+    slots = {
+        key: (occurrence.date, occurrence.period_number, costs.departments.get(absent_teacher_id))
+        for key, (occurrence, absent_teacher_id) in needed.items()
+    }
+    assignment = solve_cover(slots, candidates, costs)
+
+    assigned = []
+    unfilled = []
+    for key in sorted(needed, key=lambda key: (key[1], needed[key][0].period_number, key[0])):
+        occurrence, absent_teacher_id = needed[key]
+        planned = PlannedCover(
+            slot_id=occurrence.slot_id,
+            date=occurrence.date,
+            period_number=occurrence.period_number,
+            subject=occurrence.subject,
+            year_group=occurrence.year_group,
+            absent_teacher_id=absent_teacher_id,
+            covering_teacher_id=assignment.get(key)
+        )
+        (unfilled if planned.covering_teacher_id is None else assigned).append(planned)
+
+    return CoverPlan(assigned, unfilled)
+
+
+def apply_cover_plan(plan, commit=True):
+    # Every CoverAssignment row of the plan goes in with one executemany, in one transaction
+    conflicts = insert_cover_assignments([
+        {
+            'absent_teacher_id': planned.absent_teacher_id,
+            'covering_teacher_id': planned.covering_teacher_id,
+            'teaching_slot_id': planned.slot_id,
+            'date': planned.date,
+            'period_number': planned.period_number
+        }
+        for planned in plan.assigned
+    ])
+    if commit:
+        db.session.commit()
+    return {plan.assigned[index]: message for index, message in conflicts.items()}
+
+
+def get_teacher_names(teacher_ids):
+    return {
+        user_id: f"{first_name} {last_name}"
+        for user_id, first_name, last_name in db.session.execute(
+            db.select(User.id, User.first_name, User.last_name).where(User.id.in_(teacher_ids))
+        ).all()
+    }
+
+
+def get_plan_teacher_names(plan):
+    return get_teacher_names(
+        {planned.absent_teacher_id for planned in plan.assigned + plan.unfilled}
+        | {planned.covering_teacher_id for planned in plan.assigned}
+    )
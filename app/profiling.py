@@ -0,0 +1,92 @@
+import cProfile
+import os
+import re
+import time
+from datetime import datetime
+
+from flask import g, request
+from flask_login import current_user
+
+
+def _profile_requested(app):
+    return (
+        request.headers.get(app.config['PROFILE_HEADER']) == '1'
+        or request.args.get(app.config['PROFILE_QUERY_ARG']) == '1'
+    )
+
+
+def _rotate(directory, max_bytes):
+    # Deletes the oldest profiles until the directory fits under max_bytes
+    profiles = [
+        entry for entry in os.scandir(directory)
+        if entry.is_file() and entry.name.endswith('.prof')
+    ]
+    profiles.sort(key=lambda entry: entry.stat().st_mtime)
+    total = sum(entry.stat().st_size for entry in profiles)
+    for entry in profiles[:-1]:
+        if total <= max_bytes:
+            break
+        total -= entry.stat().st_size
+        os.remove(entry.path)
+
+
+# ---------------- Request hooks ------------------
+def _start_profile(app):
+    def start_profile():
+        if not _profile_requested(app):
+            return
+        if not (current_user.is_authenticated and current_user.is_admin()):
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already running in this thread
+            return
+        g.profiler = profiler
+        g.profile_started = time.perf_counter()
+
+    return start_profile
+
+
+def _finish_profile(app):
+    def finish_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        elapsed_ms = round((time.perf_counter() - g.pop('profile_started')) * 1000)
+
+        directory = app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        path_slug = re.sub(r'[^\w-]+', '_', request.path).strip('_') or 'index'
+        filename = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{request.method}-{path_slug}-{elapsed_ms}ms.prof"
+        profiler.dump_stats(os.path.join(directory, filename))
+        _rotate(directory, app.config['PROFILE_MAX_BYTES'])
+
+        app.logger.warning(f'Profiled {request.method} {request.full_path} in {elapsed_ms} ms: {filename}')
+        response.headers['X-Profile-File'] = filename
+        return response
+
+    return finish_profile
+
+
+def _abandon_profile(exception):
+    # A view that raised never reaches after_request; never leave the profiler running
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+
+
+# ---------------- Opt-in ------------------
+# Enabled with PROFILER_ENABLED=1. An admin then profiles a single request by
+# sending the PROFILE_HEADER header (X-Profile: 1) or adding ?profile=1, e.g.
+#   /assign-cover/42?profile=1
+# The view is run under cProfile and the stats written to PROFILE_DIR as a
+# .prof file (open with snakeviz, or python -m pstats); the oldest files are
+# removed once the directory grows past PROFILE_MAX_BYTES.
+def init_profiler(app):
+    app.before_request(_start_profile(app))
+    app.after_request(_finish_profile(app))
+    app.teardown_request(_abandon_profile)
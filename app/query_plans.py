@@ -0,0 +1,102 @@
+import re
+from datetime import date
+
+from sqlalchemy import event
+
+from app import db
+from app.models import LeaveRequest, CoverAssignment
+from app.helpers import get_teaching_slots_by_date_range, get_unavailable_teachers, insert_cover_assignments
+from app.availability import get_slot_teacher_mapping_sql
+from app.planner import plan_cover
+from app.timetable_index import timetable_index
+from app.workload import get_workload
+
+# Tables that grow with the school's history; a full scan of any of these in a
+# hot path is a regression. Small lookup tables (user, department, lesson) may scan.
+HOT_TABLES = ('teaching_slot', 'leave_request', 'cover_assignment', 'cover_workload')
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def _hot_paths(leave_request):
+    existing_cover = db.session.execute(db.select(CoverAssignment).where(CoverAssignment.date.is_not(None))).scalar()
+    teacher_ids = [leave_request.user_id]
+
+    paths = [
+        ('get_teaching_slots_by_date_range', lambda: get_teaching_slots_by_date_range(
+            leave_request.user_id, leave_request.start_date, leave_request.end_date)),
+        ('get_unavailable_teachers', lambda: get_unavailable_teachers(
+            leave_request.start_date, leave_request.end_date)),
+        ('get_slot_teacher_mapping_sql', lambda: get_slot_teacher_mapping_sql(leave_request)),
+        ('get_workload', lambda: get_workload(teacher_ids, leave_request.start_date, leave_request.end_date)),
+        ('plan_cover', lambda: plan_cover(leave_request.start_date, leave_request.end_date)),
+    ]
+    if existing_cover is not None:
+        # A batch that clashes with an existing row exercises the conflict query without writing
+        paths.append(('insert_cover_assignments', lambda: insert_cover_assignments([{
+            'absent_teacher_id': existing_cover.absent_teacher_id,
+            'covering_teacher_id': existing_cover.covering_teacher_id,
+            'teaching_slot_id': existing_cover.teaching_slot_id,
+            'date': existing_cover.date,
+            'period_number': existing_cover.period_number
+        }])))
+    return paths
+
+
+def _capture_statements(path):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    engine = db.session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        path()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def _full_scans(connection, statement, parameters):
+    if connection.dialect.name == 'postgresql':
+        plan = [row[0] for row in connection.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+        pattern = POSTGRES_SCAN
+    else:
+        plan = [row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        pattern = SQLITE_SCAN
+
+    # SQLite reports aliased tables as e.g. teaching_slot_1
+    scanned = {re.sub(r'_\d+$', '', match.group(1)) for line in plan for match in pattern.finditer(line.strip())}
+    return sorted(scanned & set(HOT_TABLES)), plan
+
+
+# ---------------- Query plan regression check ------------------
+# Runs every hot helper against the current database, captures the SELECTs
+# it issues and EXPLAINs each one. Returns a list of (path, statement, tables,
+# plan) for every statement that falls back to a full scan of a hot table.
+def check_query_plans(leave_request=None):
+    if leave_request is None:
+        leave_request = db.session.execute(
+            db.select(LeaveRequest).filter_by(status='approved').order_by(LeaveRequest.id)
+        ).scalar()
+    if leave_request is None:
+        leave_request = LeaveRequest(user_id=0, start_date=date.today(), end_date=date.today(), status='approved')
+
+    # The timetable index is deliberately built with one full pass; keep it out of the capture
+    timetable_index.ensure_built()
+
+    failures = []
+    for name, path in _hot_paths(leave_request):
+        with db.session.begin_nested() as savepoint:
+            statements = _capture_statements(path)
+            connection = db.session.connection()
+            for statement, parameters in statements:
+                tables, plan = _full_scans(connection, statement, parameters)
+                if tables:
+                    failures.append((name, statement, tables, plan))
+            savepoint.rollback()
+
+    return failures
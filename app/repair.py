@@ -0,0 +1,80 @@
+from collections import namedtuple
+
+from app import db
+from app.models import TeachingSlot, Lesson, CoverAssignment
+from app.helpers import SlotOccurrence
+from app.planner import PlannedCover, solve_needed_cover, apply_cover_plan
+from app.workload import record_cover_workload
+from app.analytics import record_cover_stats
+from app.data_version import COVER_ASSIGNMENTS, bump_data_version, teacher_versions
+
+# What an incremental repair changed: the covers it withdrew, the ones that
+# replaced them and any withdrawn slot nobody could take
+CoverRepair = namedtuple('CoverRepair', ['removed', 'added', 'unfilled'])
+
+
+# ---------------- Incremental cover repair ------------------
+# When a teacher's leave is approved, only the covers they were booked to
+# give during that leave are invalid. Those are withdrawn and re-solved; every
+# other cover assignment is left exactly as it was. The caller commits.
+def repair_cover_for_leave(leave_request):
+    rows = db.session.execute(
+        db.select(CoverAssignment, TeachingSlot, Lesson)
+        .join(TeachingSlot, CoverAssignment.teaching_slot_id == TeachingSlot.id)
+        .join(Lesson, TeachingSlot.lesson_id == Lesson.id)
+        .where(
+            CoverAssignment.covering_teacher_id == leave_request.user_id,
+            CoverAssignment.date >= leave_request.start_date,
+            CoverAssignment.date <= leave_request.end_date
+        )
+    ).all()
+
+    # On partial-day leave the teacher can still give cover outside the selected periods
+    selected_periods = {(slot.date, slot.period_number) for slot in leave_request.selected_slots}
+    if selected_periods:
+        rows = [row for row in rows if (row[0].date, row[0].period_number) in selected_periods]
+    if not rows:
+        return CoverRepair([], [], [])
+
+    removed = []
+    needed = {}
+    for cover_assignment, slot, lesson in rows:
+        occurrence = SlotOccurrence(
+            slot_id=slot.id,
+            date=cover_assignment.date,
+            day_of_week=slot.day_of_week,
+            period_number=slot.period_number,
+            subject=lesson.subject,
+            year_group=lesson.year_group
+        )
+        needed[(slot.id, cover_assignment.date)] = (occurrence, cover_assignment.absent_teacher_id)
+        removed.append(PlannedCover(
+            slot_id=slot.id,
+            date=cover_assignment.date,
+            period_number=slot.period_number,
+            subject=lesson.subject,
+            year_group=lesson.year_group,
+            absent_teacher_id=cover_assignment.absent_teacher_id,
+            covering_teacher_id=cover_assignment.covering_teacher_id
+        ))
+
+    db.session.execute(
+        db.delete(CoverAssignment).where(
+            CoverAssignment.id.in_([cover_assignment.id for cover_assignment, _slot, _lesson in rows])
+        )
+    )
+    record_cover_workload(((planned.covering_teacher_id, planned.date) for planned in removed), delta=-1)
+    record_cover_stats(((planned.absent_teacher_id, planned.covering_teacher_id, planned.date)
+                        for planned in removed), delta=-1)
+    bump_data_version(COVER_ASSIGNMENTS, *teacher_versions(
+        [planned.absent_teacher_id for planned in removed] + [planned.covering_teacher_id for planned in removed]
+    ))
+
+    dates = [key[1] for key in needed]
+    plan = solve_needed_cover(needed, min(dates), max(dates))
+    if apply_cover_plan(plan, commit=False):
+        return CoverRepair(removed, [], plan.unfilled + [
+            planned._replace(covering_teacher_id=None) for planned in plan.assigned
+        ])
+
+    return CoverRepair(removed, plan.assigned, plan.unfilled)
@@ -0,0 +1,278 @@
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models import User, Department, Lesson, TeachingSlot, LeaveRequest, LeaveRequestSlot, CoverAssignment
+
+# Rows fetched from the server-side cursor per round trip, and rows per CSV chunk sent
+FETCH_SIZE = 2000
+CHUNK_ROWS = 500
+
+# Leading characters that make a spreadsheet read a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')  # Control characters XML cannot hold
+
+
+# ---------------- Report queries ------------------
+# Each report is a header plus a flat SELECT read through a streaming cursor, so
+# rows reach the writer as the database produces them and only one fetch
+# batch is ever held in memory.
+def _leave_query(start_date, end_date):
+    # Partial-day leave: the lessons the teacher picked, and the days they fall on
+    selected = db.select(LeaveRequestSlot.id).where(LeaveRequestSlot.leave_request_id == LeaveRequest.id)
+    query = db.select(
+        LeaveRequest.id, User.first_name, User.last_name, User.email, Department.name,
+        LeaveRequest.start_date, LeaveRequest.end_date, LeaveRequest.status, LeaveRequest.reason,
+        selected.with_only_columns(db.func.count()).scalar_subquery(),
+        selected.with_only_columns(db.func.count(LeaveRequestSlot.date.distinct())).scalar_subquery()
+    ).join(User, LeaveRequest.user_id == User.id) \
+        .outerjoin(Department, User.department_id == Department.id) \
+        .order_by(LeaveRequest.start_date, LeaveRequest.id)
+    if start_date:
+        query = query.where(LeaveRequest.end_date >= start_date)
+    if end_date:
+        query = query.where(LeaveRequest.start_date <= end_date)
+    return query
+
+
+def _cover_query(start_date, end_date):
+    absent, covering = aliased(User), aliased(User)
+    absent_department, covering_department = aliased(Department), aliased(Department)
+    query = db.select(
+        CoverAssignment.id, CoverAssignment.date, TeachingSlot.period_number, Lesson.subject, Lesson.year_group,
+        absent.first_name, absent.last_name, absent_department.name,
+        covering.first_name, covering.last_name, covering_department.name
+    ).join(TeachingSlot, CoverAssignment.teaching_slot_id == TeachingSlot.id) \
+        .outerjoin(Lesson, TeachingSlot.lesson_id == Lesson.id) \
+        .join(absent, CoverAssignment.absent_teacher_id == absent.id) \
+        .outerjoin(absent_department, absent.department_id == absent_department.id) \
+        .join(covering, CoverAssignment.covering_teacher_id == covering.id) \
+        .outerjoin(covering_department, covering.department_id == covering_department.id) \
+        .order_by(CoverAssignment.date, TeachingSlot.period_number, CoverAssignment.id)
+    if start_date:
+        query = query.where(CoverAssignment.date >= start_date)
+    if end_date:
+        query = query.where(CoverAssignment.date <= end_date)
+    return query
+
+
+def _school_day_count(start, end):
+    # Weekdays from start to end inclusive, as the absence analytics count them
+    weeks, extra = divmod((end - start).days + 1, 7)
+    return weeks * 5 + sum(1 for offset in range(extra) if (start.weekday() + offset) % 7 < 5)
+
+
+def _leave_rows(start_date, end_date):
+    # days: school days away (only those with a selected lesson, for partial-day
+    # leave); lessons: the selected lessons, blank when the whole day is taken
+    for leave_id, first_name, last_name, email, department, start, end, status, reason, lessons, lesson_days in \
+            _stream(_leave_query(start_date, end_date)):
+        days = lesson_days if lessons else _school_day_count(start, end)
+        yield (leave_id, f'{first_name} {last_name}', email, department or '', start.isoformat(),
+               end.isoformat(), days, lessons or '', status, reason or '')
+
+
+def _cover_rows(start_date, end_date):
+    for (cover_id, cover_date, period_number, subject, year_group, absent_first, absent_last, absent_department,
+         covering_first, covering_last, covering_department) in _stream(_cover_query(start_date, end_date)):
+        yield (cover_id, cover_date.isoformat() if cover_date else '', period_number, subject or '',
+               year_group or '', f'{absent_first} {absent_last}', absent_department or '',
+               f'{covering_first} {covering_last}', covering_department or '')
+
+
+REPORTS = {
+    'leave': (
+        ['leave_request_id', 'teacher', 'email', 'department', 'start_date', 'end_date', 'days', 'lessons',
+         'status', 'reason'],
+        _leave_rows
+    ),
+    'covers': (
+        ['cover_assignment_id', 'date', 'period', 'subject', 'year_group', 'absent_teacher', 'absent_department',
+         'covering_teacher', 'covering_department'],
+        _cover_rows
+    ),
+}
+
+
+def count_report_rows(report, start_date=None, end_date=None):
+    # One COUNT over the report's query, for progress while a background export runs
+    query = {'leave': _leave_query, 'covers': _cover_query}[report](start_date, end_date)
+    return db.session.execute(
+        db.select(db.func.count()).select_from(query.order_by(None).subquery())
+    ).scalar()
+
+
+def _safe_cell(value):
+    # Quote text a spreadsheet would otherwise run as a formula (CSV injection);
+    # XLSX cells go through it too, so both formats hold the same text
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _stream(query):
+    # stream_results asks the driver for a server-side cursor (psycopg2 named
+    # cursors; sqlite3 already steps through results) and yield_per fetches it
+    # FETCH_SIZE rows at a time
+    result = db.session.execute(query.execution_options(stream_results=True, yield_per=FETCH_SIZE))
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+# ---------------- CSV writer ------------------
+# Yields the report as CSV text in chunks of CHUNK_ROWS rows; the header goes
+# out before the query runs, so the first byte never waits on the database.
+# Text cells that start like a formula are prefixed with a quote.
+def generate_csv(report, start_date=None, end_date=None):
+    header, rows = REPORTS[report]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(header)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    pending = 0
+    for row in rows(start_date, end_date):
+        writer.writerow([_safe_cell(value) for value in row])
+        pending += 1
+        if pending == CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+
+# ---------------- XLSX writer ------------------
+# The same rows as a one-sheet workbook, built with zipfile straight into the
+# response: the fixed parts go out first, then the sheet XML is deflated
+# CHUNK_ROWS rows at a time. Cells are inline strings and numbers, so no
+# shared-string table has to be held in memory.
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_END = '</sheetData></worksheet>'
+
+
+class _ChunkWriter:
+    # Write-only file for zipfile (which then streams, as it cannot seek);
+    # take() hands over what has been written since the last call
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _column_letters(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _xlsx_row(number, values, columns):
+    cells = []
+    for column, value in zip(columns, values):
+        value = _safe_cell(value)
+        if value is None or value == '':
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{column}{number}"><v>{value}</v></c>')
+        else:
+            text = escape(XML_ILLEGAL.sub('', str(value)))
+            cells.append(f'<c r="{column}{number}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+def generate_xlsx(report, start_date=None, end_date=None):
+    header, rows = REPORTS[report]
+    columns = [_column_letters(index) for index in range(len(header))]
+    output = _ChunkWriter()
+
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in XLSX_PARTS.items():
+            workbook.writestr(name, content.replace('{sheet}', report))
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((SHEET_START + _xlsx_row(1, header, columns)).encode('utf-8'))
+            yield output.take()
+
+            batch = []
+            for number, row in enumerate(rows(start_date, end_date), start=2):
+                batch.append(_xlsx_row(number, row, columns))
+                if len(batch) == CHUNK_ROWS:
+                    sheet.write(''.join(batch).encode('utf-8'))
+                    batch = []
+                    yield output.take()
+            sheet.write((''.join(batch) + SHEET_END).encode('utf-8'))
+    yield output.take()
+
+
+# Each download format: its generator and mimetype
+FORMATS = {
+    'csv': (generate_csv, 'text/csv'),
+    'xlsx': (generate_xlsx, XLSX_MIMETYPE),
+}
+
+
+def report_filename(report, start_date=None, end_date=None, extension='csv'):
+    dates = '_'.join(d.isoformat() for d in (start_date, end_date) if d)
+    return f'{report}_{dates}.{extension}' if dates else f'{report}.{extension}'
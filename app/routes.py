@@ -1,74 +1,125 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
+import os
+
+from flask import (Blueprint, render_template, redirect, url_for, request, flash, jsonify, current_app, abort,
+                   Response, stream_with_context, send_file)
 from collections import defaultdict
-from app import db, app
-from app.models import LeaveRequest, CoverAssignment, User
-from app.forms import LeaveRequestForm, CoverAssignmentForm, SignupForm, LoginForm, SlotForm
-from flask_login import login_user, logout_user, current_user, login_required, LoginManager
+from datetime import date, timedelta
+from app import db, login_manager
+from app.models import LeaveRequest, CoverAssignment, User, TeachingSlot, Job
+from app.forms import LeaveRequestForm, CoverAssignmentForm, SignupForm, LoginForm
+from flask_login import login_user, logout_user, current_user, login_required
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+from app.availability import get_available_teacher_mapping
+from app.user_cache import load_cached_user
+from app.dashboard import get_teacher_dashboard
+from app.http_cache import conditional_response
+from app.pagination import keyset_page, decode_cursor, page_size
+from app.data_version import TIMETABLE, USERS, LEAVE_REQUESTS, COVER_ASSIGNMENTS
+from app.jobs import enqueue_job, find_job, job_params, job_result, job_status, result_path
+from app.workload import get_busiest_teachers, week_start, term_start
+from app.analytics import (
+    record_absence,
+    record_absence_status_change,
+    absence_days_by,
+    weekly_absence_days,
+    cover_by_teacher,
+    cover_fill_rate
+)
 from app.helpers import (
     get_all_teachers,
     get_leave_request,
-    get_slot_teacher_mapping,
     save_cover_assignments,
-    get_slot_details,
+    UNREADABLE_LESSON,
+    populate_slot_forms,
     get_teaching_slots_by_date_range,
+    get_leave_teaching_slots,
+    set_leave_slots,
     date_range
 )
 
+# The cover solver, planner, repair and report modules are imported inside the views that
+# use them, so workers start without loading them.
+
 main = Blueprint('main', __name__)
 
-# Initialize Flask-Login's LoginManager
-login_manager = LoginManager()
-login_manager.init_app(app)
+LEAVE_STATUSES = ('pending', 'approved', 'declined')
+LEAVE_CURSOR = (date.fromisoformat, int)  # (start_date, id)
+COVER_CURSOR = (int,)  # (id,)
+MAX_TIMETABLE_DAYS = 62  # Longest range the timetable API expands
 
 
+# Served from the per-process user cache, so most requests skip the user query
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    return load_cached_user(int(user_id))
 
 
-@app.route('/')
+@main.route('/')
 def index():
     return render_template('index.html')
 
 
 # Admin Dashboard
-@app.route('/admin_dashboard')
+@main.route('/admin_dashboard')
 @login_required
 def admin_dashboard():
-    pending_count = db.session.execute(
-        db.select(LeaveRequest).filter_by(status='pending').with_only_columns(db.func.count())
-    ).scalar()
-
-    total_teachers = db.session.execute(
-        db.select(User).filter_by(role='teacher').with_only_columns(db.func.count())
-    ).scalar()
-
-    return render_template('admin_dashboard.html', pending_count=pending_count, total_teachers=total_teachers)
+    if not current_user.is_admin():
+        flash('You do not have permission to access this page.', 'danger')
+        return redirect(url_for('main.teacher_dashboard'))
+
+    # Both headline counts in one round trip
+    pending_count, total_teachers = db.session.execute(db.select(
+        db.select(db.func.count()).select_from(LeaveRequest).where(LeaveRequest.status == 'pending')
+        .scalar_subquery(),
+        db.select(db.func.count()).select_from(User).where(User.role == 'teacher').scalar_subquery()
+    )).one()
+
+    today = date.today()
+    this_week = week_start(today)
+    busiest_teachers = get_busiest_teachers('week', this_week)
+
+    # This term's absence and cover figures, read from the pre-aggregated rollups
+    term = term_start(today)
+    stats = {
+        'term_start': term,
+        'by_department': absence_days_by('department', 'term', term),
+        'by_reason': absence_days_by('reason', 'term', term),
+        'by_teacher': absence_days_by('teacher', 'term', term, limit=10),
+        'weekly': weekly_absence_days(this_week - timedelta(weeks=7), this_week),
+        'cover': cover_by_teacher('term', term),
+        'fill_rate': cover_fill_rate('term', term),
+    }
+
+    return render_template('admin_dashboard.html', pending_count=pending_count, total_teachers=total_teachers,
+                           busiest_teachers=busiest_teachers, stats=stats)
 
 
 # Teacher Dashboard
-@app.route('/teacher_dashboard')
+@main.route('/teacher_dashboard')
 @login_required
 def teacher_dashboard():
     if not current_user.is_teacher():
         flash('You do not have permission to access this page.', 'danger')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
-    pending_requests = []
-    assignments = []
-    return render_template('teacher_dashboard.html', pending_requests=pending_requests, assignments=assignments)
+    # Served from the per-teacher dashboard cache while their leave, covers and timetable are unchanged
+    dashboard = get_teacher_dashboard(current_user.id)
+    return render_template('teacher_dashboard.html', dashboard=dashboard,
+                           pending_requests=dashboard.pending_requests, assignments=dashboard.upcoming_covers)
 
 
 # Display all teachers
-@app.route('/teachers')
+@main.route('/teachers')
 @login_required
+@conditional_response(USERS)
 def teachers():
     all_teachers = get_all_teachers()
     return render_template('teachers.html', teachers=all_teachers)
 
 
 # Leave Request Route
-@app.route('/leave-request', methods=['GET', 'POST'])
+@main.route('/leave-request', methods=['GET', 'POST'])
 @login_required
 def leave_request():
     form = LeaveRequestForm()
@@ -84,135 +135,434 @@ def leave_request():
         )
         try:
             db.session.add(leave_request)
+            # Periods ticked on the form; none (or all) means the whole of every day
+            set_leave_slots(leave_request, request.form.getlist('slots'))
+            record_absence(leave_request)
             db.session.commit()
             flash('Leave request submitted successfully.')
         except Exception as e:
             db.session.rollback()
             flash('An error occurred while submitting your leave request. Please try again.')
 
-        return redirect(url_for('view_leave_requests'))
+        return redirect(url_for('main.view_leave_requests'))
     return render_template('leave_request.html', form=form)
 
 
+# ?teacher=<id>&from=YYYY-MM-DD&to=YYYY-MM-DD, shared by the leave and cover listings
+def _listing_filters(values=None):
+    values = request.args if values is None else values
+    filters = {'teacher_id': values.get('teacher', type=int), 'start_date': None, 'end_date': None}
+    for key, arg in [('start_date', 'from'), ('end_date', 'to')]:
+        try:
+            filters[key] = date.fromisoformat(values.get(arg, ''))
+        except ValueError:
+            pass
+    return filters
+
+
 # View Leave Requests
-@app.route('/view_leave_requests')
+# Each status is a keyset-paginated list, newest start date first. Without
+# ?status= the first page of every status is shown; with it, that status
+# alone can be paged through with ?before= / ?after= cursors.
+@main.route('/view_leave_requests')
 @login_required
+@conditional_response(LEAVE_REQUESTS, USERS)
 def view_leave_requests():
-    pending_requests = db.session.execute(db.select(LeaveRequest).filter_by(status='pending')).scalars().all()
-    approved_requests = db.session.execute(db.select(LeaveRequest).filter_by(status='approved')).scalars().all()
-    declined_requests = db.session.execute(db.select(LeaveRequest).filter_by(status='declined')).scalars().all()
+    filters = _listing_filters()
+    per_page = page_size()
+    status = request.args.get('status')
+    statuses = [status] if status in LEAVE_STATUSES else list(LEAVE_STATUSES)
+
+    pages = {}
+    for name in statuses:
+        query = db.select(LeaveRequest).options(joinedload(LeaveRequest.requesting_user)) \
+            .where(LeaveRequest.status == name)
+        if filters['teacher_id']:
+            query = query.where(LeaveRequest.user_id == filters['teacher_id'])
+        if filters['start_date']:
+            query = query.where(LeaveRequest.end_date >= filters['start_date'])
+        if filters['end_date']:
+            query = query.where(LeaveRequest.start_date <= filters['end_date'])
+
+        paged = len(statuses) == 1
+        pages[name] = keyset_page(
+            query, [LeaveRequest.start_date, LeaveRequest.id], lambda leave: (leave.start_date, leave.id),
+            before=decode_cursor(request.args.get('before'), LEAVE_CURSOR) if paged else None,
+            after=decode_cursor(request.args.get('after'), LEAVE_CURSOR) if paged else None,
+            per_page=per_page
+        )
 
     return render_template('view_leave_requests.html',
-                           pending_requests=pending_requests,
-                           approved_requests=approved_requests,
-                           declined_requests=declined_requests)
+                           pending_requests=pages.get('pending'),
+                           approved_requests=pages.get('approved'),
+                           declined_requests=pages.get('declined'),
+                           status=statuses[0] if len(statuses) == 1 else None,
+                           filters=filters, teachers=get_all_teachers())
 
 
 # Handle Leave Request Actions
-@app.route('/handle_request/<int:request_id>', methods=['POST'])
+@main.route('/handle_request/<int:request_id>', methods=['POST'])
 @login_required
 def handle_request(request_id):
     if not current_user.is_admin():
         flash('You do not have permission to handle leave requests.', 'danger')
-        return redirect(url_for('view_leave_requests'))
+        return redirect(url_for('main.view_leave_requests'))
 
     leave_request = get_leave_request(request_id)
     action = request.form.get('action')
     valid_actions = ['approve', 'decline']
     if action in valid_actions:
+        old_status = leave_request.status
         leave_request.status = 'approved' if action == 'approve' else 'declined'
+        record_absence_status_change(leave_request, old_status)
+
+        # Re-solve any covers the newly absent teacher was booked to give
+        from app.repair import repair_cover_for_leave
+        repair = repair_cover_for_leave(leave_request) if action == 'approve' else None
         db.session.commit()
         flash(f'Leave request {action}d successfully.', 'success')
+        if repair and repair.removed:
+            flash(f'{len(repair.removed)} cover assignments reassigned: {len(repair.added)} re-covered, '
+                  f'{len(repair.unfilled)} need cover.', 'warning' if repair.unfilled else 'info')
     else:
         flash('Invalid action. Please try again.', 'danger')
 
-    return redirect(url_for('view_leave_requests'))
+    return redirect(url_for('main.view_leave_requests'))
 
 
-@app.route('/fetch-slot-teachers/<int:leave_request_id>', methods=['GET'])
+# A teacher's lessons over a date range, expanded from the in-memory weekly
+# timetable, so the leave form can offer them as periods to cover
+@main.route('/api/teachers/<int:user_id>/timetable', methods=['GET'])
 @login_required
+@conditional_response(TIMETABLE)
+def teacher_timetable(user_id):
+    if not current_user.is_admin() and current_user.id != user_id:
+        return jsonify({"error": "You can only view your own timetable."}), 403
+    try:
+        start_date = date.fromisoformat(request.args.get('start', ''))
+        end_date = date.fromisoformat(request.args.get('end', ''))
+    except ValueError:
+        return jsonify({"error": "start and end must be dates in YYYY-MM-DD format."}), 400
+    if not 0 <= (end_date - start_date).days < MAX_TIMETABLE_DAYS:
+        return jsonify({"error": f"The range must run forwards and span at most {MAX_TIMETABLE_DAYS} days."}), 400
+
+    slots = get_teaching_slots_by_date_range(user_id, start_date, end_date)
+    return jsonify({
+        "teacher_id": user_id,
+        "fields": ["slot_id", "date", "period_number", "subject", "year_group"],
+        "slots": [
+            [slot.slot_id, slot.date.isoformat(), slot.period_number, slot.subject, slot.year_group]
+            for slot in slots
+        ]
+    })
+
+
+@main.route('/fetch-slot-teachers/<int:leave_request_id>', methods=['GET'])
+@login_required
+@conditional_response(LEAVE_REQUESTS, COVER_ASSIGNMENTS, TIMETABLE, USERS)
 def fetch_slot_teachers(leave_request_id):
     leave_request = get_leave_request(leave_request_id)
 
     if not leave_request:
         return jsonify({"error": "Leave request not found"}), 404
 
-    slot_teacher_mapping = get_slot_teacher_mapping(leave_request)
+    slot_teacher_mapping = get_available_teacher_mapping(leave_request)
     return jsonify(slot_teacher_mapping)
 
 
-@app.route('/assign-cover/<int:leave_request_id>', methods=['GET', 'POST'])
+@main.route('/assign-cover/<int:leave_request_id>', methods=['GET', 'POST'])
 @login_required
 def assign_cover(leave_request_id):
     leave_request = get_leave_request(leave_request_id)
     date_range_list = date_range(leave_request.start_date, leave_request.end_date)
 
     form = CoverAssignmentForm()
-    slot_teacher_mapping = get_slot_teacher_mapping(leave_request)
 
-    # Fetch the teaching slots for the teacher requesting leave
-    teaching_slots = get_teaching_slots_by_date_range(
-        leave_request.requesting_user.id,
-        leave_request.start_date,
-        leave_request.end_date
-    )
+    # Fetch the lessons the leave takes the teacher away from
+    teaching_slots = get_leave_teaching_slots(leave_request)
+    slot_teacher_mapping = get_available_teacher_mapping(leave_request, teaching_slots)
+
+    # Populate the cover assignment form slots
+    populate_slot_forms(form, teaching_slots, slot_teacher_mapping)
+
+    # Auto-assign mode: prefill every slot from the fairness solver. Long
+    # absences are solved by a background job, started by a POST to
+    # queue_auto_assign; the page polls it and reloads with ?job= once the
+    # proposal is ready. GETs never queue work.
+    job = None
+    if request.method == 'GET' and request.args.get('job', type=int):
+        job = db.session.get(Job, request.args.get('job', type=int))
+        if job is None or job.kind != 'auto_assign' or job_params(job)['leave_request_id'] != leave_request.id:
+            abort(404)
+        if job.status == 'succeeded':
+            form.prefill({
+                (row['slot_id'], date.fromisoformat(row['date'])): row['teacher_id']
+                for row in job_result(job)['assignments']
+            })
+            job = None
+        elif job.status == 'failed':
+            flash(f'Auto-assign failed: {job.error}', 'danger')
+            job = None
+    elif request.method == 'GET' and request.args.get('auto'):
+        if _long_absence(leave_request):
+            job = find_job('auto_assign', {'leave_request_id': leave_request.id})
+            if job is not None:
+                return redirect(url_for('main.assign_cover', leave_request_id=leave_request.id, job=job.id))
+            flash('Long absences are auto-assigned in the background. Press Auto-assign to start.', 'info')
+        else:
+            from app.cover_solver import auto_assign_cover
+            form.prefill(auto_assign_cover(leave_request, teaching_slots, slot_teacher_mapping))
 
-    # Organize the slots by date, where the date is the key
+    if form.validate_on_submit():
+        conflicts = save_cover_assignments(form, leave_request, teaching_slots)
+        if not conflicts:
+            flash("Cover assignments saved successfully!", "success")
+            return redirect(url_for('main.view_cover_assignments'))
+
+        # Redisplay the form with each clash shown against its row
+        for slot_form, message in conflicts.items():
+            slot_form.covering_teacher.errors.append(message)
+        flash("Some cover assignments could not be saved. Nothing was saved.", "danger")
+    elif form.is_submitted():
+        # Hidden slot fields that fail validation or name none of this leave's
+        # lessons (tampered or stale) are shown against their row
+        lessons = {(slot.slot_id, slot.date) for slot in teaching_slots}
+        for slot_form in form.slots:
+            if slot_form.slot_id.errors or slot_form.date.errors or \
+                    (slot_form.slot_id.data, slot_form.date.data) not in lessons:
+                slot_form.covering_teacher.errors.insert(0, UNREADABLE_LESSON)
+
+    # Organize the slot forms by date, where the date is the key
     teaching_slots_by_date = defaultdict(list)
-    for slot in teaching_slots:
-        teaching_slots_by_date[slot.date].append(slot)
-
-    # Prepare the slot details for each date in the range
-    slot_details = []
-    for date in date_range_list:
-        if date in teaching_slots_by_date:
-            slot_details.extend(teaching_slots_by_date[date])
+    for slot_form, slot in zip(form.slots, teaching_slots):
+        teaching_slots_by_date[slot.date].append((slot_form, slot))
+
+    return render_template('assign_cover.html', form=form, date_range=date_range_list, job=job,
+                           leave_request=leave_request, teaching_slots_by_date=teaching_slots_by_date,
+                           long_absence=_long_absence(leave_request))
+
+
+# Queues the background auto-assign for a long absence, then shows its progress on the cover form
+@main.route('/assign-cover/<int:leave_request_id>/auto-assign', methods=['POST'])
+@login_required
+def queue_auto_assign(leave_request_id):
+    if not current_user.is_admin():
+        flash('You do not have permission to assign cover.', 'danger')
+        return redirect(url_for('main.teacher_dashboard'))
+
+    leave_request = get_leave_request(leave_request_id)
+    if not _long_absence(leave_request):
+        return redirect(url_for('main.assign_cover', leave_request_id=leave_request.id, auto=1))
+    job = enqueue_job('auto_assign', {'leave_request_id': leave_request.id}, current_user.id)
+    db.session.commit()
+    return redirect(url_for('main.assign_cover', leave_request_id=leave_request.id, job=job.id))
+
+
+@main.route('/api/auto-assign/<int:leave_request_id>', methods=['GET', 'POST'])
+@login_required
+def auto_assign(leave_request_id):
+    if not current_user.is_admin():
+        return jsonify({"error": "You do not have permission to assign cover."}), 403
+    leave_request = get_leave_request(leave_request_id)
+
+    # Long absences are queued by a POST: 202 with the job to poll, whose result
+    # has this same shape. A GET only reports a job that is already queued.
+    if _long_absence(leave_request):
+        params = {'leave_request_id': leave_request.id}
+        if request.method == 'POST':
+            job = enqueue_job('auto_assign', params, current_user.id)
+            db.session.commit()
         else:
-            # If no slots need covering for this date, you can insert a placeholder or empty structure
-            slot_details.append({
-                "date": date,
-                "period_number": None,
-                "subject": None,
-                "year_group": None
-            })
+            job = find_job('auto_assign', params)
+            if job is None:
+                response = jsonify({"error": "Long absences are auto-assigned in the background. POST to start."})
+                response.headers['Allow'] = 'POST'
+                return response, 405
+        return jsonify({"job_id": job.id, "status_url": url_for('main.job_status_api', job_id=job.id)}), 202
 
-    # Populate the cover assignment form slots
-    for slot_id, teachers in slot_teacher_mapping.items():
-        slot_form = SlotForm()
-        slot_form.slot_id.data = slot_id
-        slot_form.covering_teacher.choices = [(t['id'], t['name']) for t in teachers]
-        form.slots.append_entry(slot_form)
+    teaching_slots = get_leave_teaching_slots(leave_request)
+    slot_teacher_mapping = get_available_teacher_mapping(leave_request, teaching_slots)
 
-    if form.validate_on_submit():
-        save_cover_assignments(form, leave_request)
-        flash("Cover assignments saved successfully!", "success")
-        return redirect(url_for('view_cover_assignments'))
+    from app.cover_solver import auto_assign_cover, auto_assign_summary
+    assignment = auto_assign_cover(leave_request, teaching_slots, slot_teacher_mapping)
+    return jsonify(auto_assign_summary(teaching_slots, slot_teacher_mapping, assignment))
+
+
+def _long_absence(leave_request):
+    return (leave_request.end_date - leave_request.start_date).days >= current_app.config['AUTO_ASSIGN_ASYNC_DAYS']
+
+
+# Whole-school cover plan for every approved absence on a date range
+@main.route('/cover-plan', methods=['GET', 'POST'])
+@login_required
+def cover_plan():
+    from app.planner import plan_cover, apply_cover_plan, get_plan_teacher_names
+
+    if not current_user.is_admin():
+        flash('You do not have permission to plan cover.', 'danger')
+        return redirect(url_for('main.teacher_dashboard'))
+
+    try:
+        start_date = date.fromisoformat(request.values.get('start_date', ''))
+    except ValueError:
+        start_date = date.today()
+    try:
+        end_date = max(date.fromisoformat(request.values.get('end_date', '')), start_date)
+    except ValueError:
+        end_date = start_date
+
+    plan = plan_cover(start_date, end_date)
+
+    if request.method == 'POST':
+        if apply_cover_plan(plan):
+            flash('The cover plan clashes with assignments saved since it was computed. Please review it again.',
+                  'danger')
+            return redirect(url_for('main.cover_plan', start_date=start_date.isoformat(), end_date=end_date.isoformat()))
+        flash(f'{len(plan.assigned)} cover assignments saved, {len(plan.unfilled)} slots left unfilled.',
+              'success' if not plan.unfilled else 'warning')
+        return redirect(url_for('main.cover_plan', start_date=start_date.isoformat(), end_date=end_date.isoformat()))
+
+    return render_template('cover_plan.html', plan=plan, names=get_plan_teacher_names(plan),
+                           start_date=start_date, end_date=end_date)
+
+
+# Termly exports for the local authority, streamed as CSV or XLSX while the query runs
+@main.route('/reports/<report>.<any(csv, xlsx):extension>')
+@login_required
+def download_report(report, extension):
+    from app.reports import REPORTS, FORMATS, report_filename
 
-    # Pass 'teaching_slots_by_date' and other necessary variables to the template
-    return render_template('assign_cover.html', form=form, slot_details=slot_details, date_range=date_range_list,
-                           zip=zip, leave_request=leave_request, teaching_slots_by_date=teaching_slots_by_date)
+    if not current_user.is_admin():
+        flash('You do not have permission to download reports.', 'danger')
+        return redirect(url_for('main.teacher_dashboard'))
+    if report not in REPORTS:
+        abort(404)
+
+    filters = _listing_filters()
+    generate, mimetype = FORMATS[extension]
+    return Response(
+        stream_with_context(generate(report, filters['start_date'], filters['end_date'])),
+        mimetype=mimetype,
+        headers={'Content-Disposition': 'attachment; filename='
+                 + report_filename(report, filters['start_date'], filters['end_date'], extension)}
+    )
+
+
+# Queues a report export (e.g. a whole term) for the worker, then shows its progress
+@main.route('/reports/<report>/export', methods=['POST'])
+@login_required
+def export_report(report):
+    from app.reports import REPORTS
+
+    if not current_user.is_admin():
+        flash('You do not have permission to download reports.', 'danger')
+        return redirect(url_for('main.teacher_dashboard'))
+    if report not in REPORTS:
+        abort(404)
+
+    filters = _listing_filters(request.values)
+    job = enqueue_job('export_report', {'report': report, 'start_date': filters['start_date'],
+                                        'end_date': filters['end_date']}, current_user.id)
+    db.session.commit()
+    return redirect(url_for('main.view_job', job_id=job.id))
+
+
+@main.route('/jobs/rebuild-analytics', methods=['POST'])
+@login_required
+def queue_analytics_rebuild():
+    if not current_user.is_admin():
+        flash('You do not have permission to rebuild analytics.', 'danger')
+        return redirect(url_for('main.teacher_dashboard'))
+
+    job = enqueue_job('rebuild_analytics', user_id=current_user.id)
+    db.session.commit()
+    return redirect(url_for('main.view_job', job_id=job.id))
+
+
+# ---------------- Background jobs ------------------
+# Status, progress and results of queued work. Users see their own jobs;
+# admins see all of them.
+def _get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or not (current_user.is_admin() or job.created_by == current_user.id):
+        abort(404)
+    return job
+
+
+@main.route('/api/jobs/<int:job_id>')
+@login_required
+def job_status_api(job_id):
+    job = _get_job(job_id)
+    status = job_status(job)
+    if result_path(job):
+        status['download_url'] = url_for('main.download_job_result', job_id=job.id)
+    response = jsonify(status)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@main.route('/jobs/<int:job_id>')
+@login_required
+def view_job(job_id):
+    job = _get_job(job_id)
+    return render_template('job.html', job=job, result=job_result(job),
+                           download=bool(result_path(job)))
+
+
+@main.route('/jobs/<int:job_id>/download')
+@login_required
+def download_job_result(job_id):
+    job = _get_job(job_id)
+    path = result_path(job)
+    if path is None or not os.path.exists(path):
+        abort(404)
+    return send_file(path, mimetype='text/csv', as_attachment=True, download_name=job_result(job)['download_name'])
 
 
 # View Cover Assignments
-@app.route('/cover_assignments')
+# Newest first, keyset-paginated on the primary key, with the teacher and
+# date filters applied in SQL and the displayed relationships joined in, so
+# each page is one query however many covers have been arranged.
+@main.route('/cover_assignments')
 @login_required
+@conditional_response(COVER_ASSIGNMENTS, TIMETABLE, USERS)
 def view_cover_assignments():
-    cover_assignments = db.session.execute(db.select(CoverAssignment)).scalars().all()
-    return render_template('cover_assignments.html', cover_assignments=cover_assignments)
+    filters = _listing_filters()
+    query = db.select(CoverAssignment).options(
+        joinedload(CoverAssignment.absent_teacher),
+        joinedload(CoverAssignment.covering_teacher),
+        joinedload(CoverAssignment.teaching_slot).joinedload(TeachingSlot.lesson)
+    )
+    if filters['teacher_id']:
+        query = query.where(or_(CoverAssignment.absent_teacher_id == filters['teacher_id'],
+                                CoverAssignment.covering_teacher_id == filters['teacher_id']))
+    if filters['start_date']:
+        query = query.where(CoverAssignment.date >= filters['start_date'])
+    if filters['end_date']:
+        query = query.where(CoverAssignment.date <= filters['end_date'])
+
+    page = keyset_page(
+        query, [CoverAssignment.id], lambda assignment: (assignment.id,),
+        before=decode_cursor(request.args.get('before'), COVER_CURSOR),
+        after=decode_cursor(request.args.get('after'), COVER_CURSOR),
+        per_page=page_size()
+    )
+    return render_template('cover_assignments.html', cover_assignments=page.items, page=page,
+                           filters=filters, teachers=get_all_teachers())
 
 
 # Sign Up Options
-@app.route('/sign_up_options')
+@main.route('/sign_up_options')
 def sign_up_options():
     return render_template('index.html')
 
 
 # Signup Route
-@app.route('/signup/<role>', methods=['GET', 'POST'])
+@main.route('/signup/<role>', methods=['GET', 'POST'])
 def sign_up(role):
     if role not in ['teacher', 'admin']:
         flash('Invalid role specified.')
-        return redirect(url_for('sign_up_options'))
+        return redirect(url_for('main.sign_up_options'))
 
     form = SignupForm()
     if form.validate_on_submit():
@@ -236,7 +586,7 @@ def sign_up(role):
 
             login_user(new_user)
             flash(f'Sign up successful. You are now logged in as a {role}.')
-            return redirect(url_for('admin_dashboard') if role == 'admin' else url_for('teacher_dashboard'))
+            return redirect(url_for('main.admin_dashboard') if role == 'admin' else url_for('main.teacher_dashboard'))
 
         flash('Email already exists. Please use a different email.')
 
@@ -244,10 +594,10 @@ def sign_up(role):
 
 
 # Login Route
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('admin_dashboard') if current_user.is_admin() else url_for('teacher_dashboard'))
+        return redirect(url_for('main.admin_dashboard') if current_user.is_admin() else url_for('main.teacher_dashboard'))
 
     form = LoginForm()
     if form.validate_on_submit():
@@ -256,7 +606,7 @@ def login():
         if user and user.verify_password(form.password.data):
             login_user(user, remember=form.remember.data)
             flash('Login successful!', 'success')
-            return redirect(url_for('admin_dashboard') if user.is_admin() else url_for('teacher_dashboard'))
+            return redirect(url_for('main.admin_dashboard') if user.is_admin() else url_for('main.teacher_dashboard'))
         else:
             flash('Login failed. Check your email and password.', 'danger')
 
@@ -264,11 +614,11 @@ def login():
 
 
 # Logout Route
-@app.route('/logout')
+@main.route('/logout')
 @login_required
 def logout():
     user_email = current_user.email
     logout_user()
     flash('You have been logged out successfully!', 'success')
-    app.logger.info(f'User {user_email} logged out.')
-    return redirect(url_for('login'))
+    current_app.logger.info(f'User {user_email} logged out.')
+    return redirect(url_for('main.login'))
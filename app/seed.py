@@ -1,103 +1,258 @@
 # app/seed.py
+#
+# Synthetic school generator. Run with defaults for a small demo school, or
+# scale it up for load testing, e.g.:
+#
+#   python -m app.seed --teachers 300 --days 5 --periods 8 --terms 6 --absence-rate 0.05 --seed 42
 
+import argparse
 import os
+import random
 import sys
-from datetime import date, timedelta
-from random import choice
+from datetime import date, datetime, timedelta
 
 # Add the parent directory to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app import db, app
+from faker import Faker
+from werkzeug.security import generate_password_hash
+
+from app import db, create_app
 from app.models import User, Department, LeaveRequest, Lesson, TeachingSlot, CoverAssignment
+from app.workload import term_start, rebuild_workload
+from app.analytics import rebuild_analytics
+from app.data_version import ALL_DATA_VERSIONS, bump_data_version
+
+SUBJECTS = [
+    'Mathematics', 'Science', 'English', 'History', 'Geography', 'Art',
+    'Music', 'Physical Education', 'Computing', 'Languages'
+]
+YEAR_GROUPS = [f'Year {year}' for year in range(7, 14)]
+REASONS = ['Personal', 'Illness', 'Professional Development', 'Field Trip']
+
+TERM_WEEKS = 12  # Teaching weeks generated per term
+MAX_ABSENCE_DAYS = 5  # Longest single absence, in school days
+TEACHING_LOAD = (0.6, 0.85)  # Share of the week's periods each teacher teaches
+
+
+def _insert_chunks(table, rows, chunk_size):
+    # Streams rows from a generator into the table with one executemany per chunk
+    chunk = []
+    count = 0
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.session.execute(db.insert(table), chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(db.insert(table), chunk)
+        count += len(chunk)
+    return count
+
+
+def _reset_sequences(*tables):
+    # Rows are inserted with explicit ids; Postgres sequences must be moved past them
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    for table in tables:
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM \"{table.name}\"), 1))"
+        ))
+
+
+def _school_days(terms, days, today):
+    # Every teaching day of the last `terms` terms, oldest first, plus two weeks ahead
+    starts = [term_start(today)]
+    while len(starts) < terms:
+        starts.append(term_start(starts[-1] - timedelta(days=1)))
+
+    school_days = []
+    for first_day in reversed(starts):
+        last_day = min(first_day + timedelta(weeks=TERM_WEEKS), today + timedelta(weeks=2))
+        school_days.extend(
+            first_day + timedelta(days=offset)
+            for offset in range((last_day - first_day).days)
+            if (first_day + timedelta(days=offset)).weekday() < days
+        )
+    return school_days
 
 
 # Define a function to seed the database
-def seed_data():
+def seed_data(teachers=20, days=5, periods=6, terms=1, absence_rate=0.05, seed=None, chunk_size=5000):
+    rng = random.Random(seed)
+    fake = Faker()
+    fake.seed_instance(seed)
+    today = date.today()
+
+    app = create_app()
     with app.app_context():
         # Clear existing data
-        db.drop_all()  # Optional: Uncomment if you want to clear existing data
-        db.create_all()  # Create tables
-
-        # Seed Departments
-        departments = [
-            Department(name='Mathematics'),
-            Department(name='Science'),
-            Department(name='Literature'),
-            Department(name='History'),
-            Department(name='Art')
-        ]
-        db.session.bulk_save_objects(departments)
-
-        # Seed Users - One admin and nine teachers with real names
-        users = [
-            User(email='admin@example.com', first_name='Admin', last_name='User', role='admin'),
-            User(email='jane.doe@example.com', first_name='Jane', last_name='Doe', role='teacher', department_id=1),
-            # Mathematics
-            User(email='john.doe@example.com', first_name='John', last_name='Doe', role='teacher', department_id=2),
-            # Science
-            User(email='alice.johnson@example.com', first_name='Alice', last_name='Johnson', role='teacher',
-                 department_id=3),  # Literature
-            User(email='bob.williams@example.com', first_name='Bob', last_name='Williams', role='teacher',
-                 department_id=4),  # History
-            User(email='mary.brown@example.com', first_name='Mary', last_name='Brown', role='teacher', department_id=5),
-            # Art
-            User(email='david.smith@example.com', first_name='David', last_name='Smith', role='teacher',
-                 department_id=1),  # Mathematics
-            User(email='susan.clark@example.com', first_name='Susan', last_name='Clark', role='teacher',
-                 department_id=2),  # Science
-            User(email='michael.evans@example.com', first_name='Michael', last_name='Evans', role='teacher',
-                 department_id=3),  # Literature
-            User(email='linda.martin@example.com', first_name='Linda', last_name='Martin', role='teacher',
-                 department_id=4)  # History
-        ]
-
-        for user in users:
-            user.set_password('password')  # Set a default password
-        db.session.bulk_save_objects(users)
-
-        # Seed Lessons
-        lessons = [
-            Lesson(year_group='Year 10', subject='Mathematics'),
-            Lesson(year_group='Year 11', subject='Science'),
-            Lesson(year_group='Year 12', subject='Literature'),
-            Lesson(year_group='Year 10', subject='History'),
-            Lesson(year_group='Year 11', subject='Art'),
-            Lesson(year_group='Year 11', subject='Science'),
-            Lesson(year_group='Year 10', subject='Science'),
-            Lesson(year_group='Year 12', subject='Literature'),
-            Lesson(year_group='Year 11', subject='Art'),
-            Lesson(year_group='Year 10', subject='Mathematics')
-        ]
-        db.session.bulk_save_objects(lessons)
-
-        # Seed Leave Requests
-        leave_requests = []
-        for user_id in range(2, 11):  # Assuming user IDs 2-10
-            start_date = date.today() + timedelta(days=choice(range(1, 30)))
-            end_date = start_date + timedelta(days=choice(range(1, 5)))  # Random end date within 4 days
-            reason = choice(['Family emergency', 'Sick leave', 'Personal reasons', 'Vacation'])
-            status = choice(['pending', 'approved', 'declined'])
-            leave_requests.append(
-                LeaveRequest(user_id=user_id, start_date=start_date, end_date=end_date, reason=reason, status=status))
-        db.session.bulk_save_objects(leave_requests)
-
-        # Seed Teaching Slots
-        teaching_slots = []
-        for teacher_id in range(2, 11):  # Skip admin (id 1)
-            for _ in range(20):  # Each teacher gets 20 teaching slots
-                lesson_id = choice(range(1, 11))  # Choose a lesson randomly
-                day_of_week = choice(range(1, 6))  # Random day of the week (1-5)
-                period_number = choice(range(1, 7))  # Random period number (1-6)
-                teaching_slots.append(TeachingSlot(lesson_id=lesson_id, teacher_id=teacher_id, day_of_week=day_of_week,
-                                                   period_number=period_number))
-
-        db.session.bulk_save_objects(teaching_slots)
-
-        # Commit the session
+        db.drop_all()
+        db.create_all()
+
+        # Seed Departments: one per subject
+        departments = SUBJECTS[:max(1, min(len(SUBJECTS), teachers // 3 or 1))]
+        _insert_chunks(Department.__table__, (
+            {'id': department_id, 'name': name} for department_id, name in enumerate(departments, start=1)
+        ), chunk_size)
+
+        # Seed Users: one admin and the teaching staff, all sharing one password hash
+        password_hash = generate_password_hash('password')
+        teacher_ids = list(range(2, teachers + 2))
+        teacher_departments = {teacher_id: rng.randint(1, len(departments)) for teacher_id in teacher_ids}
+
+        def users():
+            yield {'id': 1, 'email': 'admin@example.com', 'password_hash': password_hash, 'role': 'admin',
+                   'first_name': 'Admin', 'last_name': 'User', 'department_id': None}
+            for teacher_id in teacher_ids:
+                first_name, last_name = fake.first_name(), fake.last_name()
+                yield {
+                    'id': teacher_id,
+                    'email': f'{first_name}.{last_name}.{teacher_id}@example.com'.lower(),
+                    'password_hash': password_hash,
+                    'role': 'teacher',
+                    'first_name': first_name,
+                    'last_name': last_name,
+                    'department_id': teacher_departments[teacher_id]
+                }
+
+        _insert_chunks(User.__table__, users(), chunk_size)
+
+        # Seed Lessons: every subject for every year group
+        lesson_ids = {}
+        for subject in departments:
+            for year_group in YEAR_GROUPS:
+                lesson_ids[(subject, year_group)] = len(lesson_ids) + 1
+        _insert_chunks(Lesson.__table__, (
+            {'id': lesson_id, 'subject': subject, 'year_group': year_group}
+            for (subject, year_group), lesson_id in lesson_ids.items()
+        ), chunk_size)
+
+        # Seed Teaching Slots: each teacher teaches a clash-free subset of the week's
+        # (day_of_week, period_number) cells, with day_of_week matching date.weekday()
+        cells = [(day_of_week, period_number) for day_of_week in range(days) for period_number in range(1, periods + 1)]
+        timetable = {}  # (day_of_week, period_number) -> [(slot_id, teacher_id), ...]
+        slot_rows = []
+        for teacher_id in teacher_ids:
+            subject = departments[teacher_departments[teacher_id] - 1]
+            teaching_cells = rng.sample(cells, round(len(cells) * rng.uniform(*TEACHING_LOAD)))
+            for day_of_week, period_number in sorted(teaching_cells):
+                slot_id = len(slot_rows) + 1
+                slot_rows.append({
+                    'id': slot_id,
+                    'lesson_id': lesson_ids[(subject, rng.choice(YEAR_GROUPS))],
+                    'teacher_id': teacher_id,
+                    'date': None,
+                    'leave_request_id': None,
+                    'day_of_week': day_of_week,
+                    'period_number': period_number
+                })
+                timetable.setdefault((day_of_week, period_number), []).append((slot_id, teacher_id))
+        _insert_chunks(TeachingSlot.__table__, iter(slot_rows), chunk_size)
+        slot_count = len(slot_rows)
+        del slot_rows
+
+        free_teachers = {
+            cell: [teacher_id for teacher_id in teacher_ids if teacher_id not in {busy for _slot, busy in teaching}]
+            for cell, teaching in timetable.items()
+        }
+
+        # Seed Leave Requests and Cover Assignments, one school day at a time
+        school_days = _school_days(terms, days, today)
+        absence_start_rate = absence_rate / ((1 + MAX_ABSENCE_DAYS) / 2)
+        leave_rows = []
+        counts = {'leave_request': 0, 'cover_assignment': 0}
+
+        def flush_leave_requests():
+            counts['leave_request'] += _insert_chunks(LeaveRequest.__table__, iter(leave_rows), chunk_size)
+            leave_rows.clear()
+
+        def cover_assignments():
+            absent_until = {}  # teacher_id -> index of their last absent school day
+            for index, day in enumerate(school_days):
+                for teacher_id in teacher_ids:
+                    if absent_until.get(teacher_id, -1) < index and rng.random() < absence_start_rate:
+                        last_index = min(index + rng.randint(1, MAX_ABSENCE_DAYS), len(school_days)) - 1
+                        while term_start(school_days[last_index]) != term_start(day):
+                            last_index -= 1
+                        status = 'pending' if day > today else rng.choices(['approved', 'declined'], [19, 1])[0]
+                        if status != 'declined':
+                            absent_until[teacher_id] = last_index
+                        leave_rows.append({
+                            'id': counts['leave_request'] + len(leave_rows) + 1,
+                            'user_id': teacher_id,
+                            'start_date': day,
+                            'end_date': school_days[last_index],
+                            'reason': rng.choice(REASONS),
+                            'status': status,
+                            'comment': fake.sentence()
+                        })
+                if len(leave_rows) >= chunk_size:
+                    flush_leave_requests()
+
+                if day > today:
+                    continue
+
+                absent = {teacher_id for teacher_id, last_index in absent_until.items() if last_index >= index}
+                created_at = datetime.combine(day, datetime.min.time())
+                for period_number in range(1, periods + 1):
+                    cell = (day.weekday(), period_number)
+                    candidates = [teacher_id for teacher_id in free_teachers.get(cell, teacher_ids)
+                                  if teacher_id not in absent]
+                    rng.shuffle(candidates)
+                    for slot_id, teacher_id in timetable.get(cell, []):
+                        if teacher_id in absent and candidates:
+                            yield {
+                                'absent_teacher_id': teacher_id,
+                                'covering_teacher_id': candidates.pop(),
+                                'teaching_slot_id': slot_id,
+                                'date': day,
+                                'period_number': period_number,
+                                'created_at': created_at
+                            }
+
+        counts['cover_assignment'] = _insert_chunks(CoverAssignment.__table__, cover_assignments(), chunk_size)
+        flush_leave_requests()
+
+        _reset_sequences(Department.__table__, User.__table__, Lesson.__table__, TeachingSlot.__table__,
+                         LeaveRequest.__table__, CoverAssignment.__table__)
+
+        # The bulk inserts skip the ORM events, so tell other processes everything changed
+        bump_data_version(*ALL_DATA_VERSIONS)
+
+        # Commit the session, then derive the workload counters and analytics rollups from the history
         db.session.commit()
-        print("Data seeded successfully.")
+        rebuild_workload()
+        rebuild_analytics()
+
+        print(f"Data seeded successfully: {teachers} teachers, {slot_count} teaching slots, "
+              f"{counts['leave_request']} leave requests, {counts['cover_assignment']} cover assignments.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed the database with a synthetic school.')
+    parser.add_argument('--teachers', type=int, default=20, help='Number of teaching staff.')
+    parser.add_argument('--days', type=int, default=5, help='School days per week, starting on Monday.')
+    parser.add_argument('--periods', type=int, default=6, help='Periods per school day.')
+    parser.add_argument('--terms', type=int, default=1, help='Terms of leave and cover history, ending now.')
+    parser.add_argument('--absence-rate', type=float, default=0.05,
+                        help='Share of teacher-days lost to absence.')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for a reproducible school.')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk insert.')
+    args = parser.parse_args(argv)
+
+    seed_data(
+        teachers=args.teachers,
+        days=args.days,
+        periods=args.periods,
+        terms=args.terms,
+        absence_rate=args.absence_rate,
+        seed=args.seed,
+        chunk_size=args.chunk_size
+    )
 
 
 if __name__ == '__main__':
-    seed_data()
\ No newline at end of file
+    main()
@@ -0,0 +1,234 @@
+import csv
+from collections import namedtuple
+
+from app import db
+from app.models import User, Lesson, TeachingSlot, LeaveRequestSlot, CoverAssignment
+from app.data_version import TIMETABLE, bump_data_version
+from app.timetable_index import PERIOD_BITS
+
+DAY_NAMES = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# MIS exports name their columns differently; each field accepts any of these headers
+COLUMN_ALIASES = {
+    'email': ('email', 'teacher_email', 'teacher'),
+    'day': ('day', 'day_of_week', 'weekday'),
+    'period': ('period', 'period_number'),
+    'subject': ('subject',),
+    'year_group': ('year_group', 'year', 'yeargroup'),
+}
+
+ImportResult = namedtuple('ImportResult', [
+    'rows', 'added', 'changed', 'unchanged', 'removed', 'kept', 'new_lessons', 'pruned'
+])
+
+
+class TimetableImportError(Exception):
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} rows could not be imported.')
+        self.errors = errors
+
+
+def parse_day(value):
+    value = value.strip().lower()
+    if value.isdigit():
+        day_of_week = int(value)
+        return day_of_week if day_of_week < len(DAY_NAMES) else None
+    for day_of_week, name in enumerate(DAY_NAMES):
+        if len(value) >= 3 and name.startswith(value):
+            return day_of_week
+    return None
+
+
+def _columns(header):
+    # {field: position of its column in each row}
+    normalised = {name.strip().lower().replace(' ', '_'): position for position, name in enumerate(header or [])}
+    columns, missing = {}, []
+    for field, aliases in COLUMN_ALIASES.items():
+        found = next((normalised[alias] for alias in aliases if alias in normalised), None)
+        if found is None:
+            missing.append(field)
+        columns[field] = found
+    if missing:
+        raise TimetableImportError([(1, f"Missing column(s): {', '.join(missing)}.")])
+    return columns
+
+
+# ---------------- Reading ------------------
+# Streams the CSV once, keeping only the wanted slots: {(teacher_id,
+# day_of_week, period_number): (subject, year_group)}. Teachers are resolved with one query for all emails after the
+# read. Clashes (a teacher given two different lessons in one period) and bad
+# rows are collected as (line, message) so nothing is written if any exist.
+def read_timetable(stream):
+    reader = csv.reader(stream)
+    columns = _columns(next(reader, None))
+    email_column, day_column, period_column = columns['email'], columns['day'], columns['period']
+    subject_column, year_group_column = columns['subject'], columns['year_group']
+    width = max(columns.values()) + 1
+    days = {}  # Each distinct day spelling is parsed once
+
+    errors = []
+    wanted = {}  # (email, day_of_week, period_number) -> (lesson, line)
+    rows = 0
+    for row in reader:
+        if not row:
+            continue
+        rows += 1
+        line = reader.line_num
+        if len(row) < width:
+            errors.append((line, f'Expected at least {width} columns, found {len(row)}.'))
+            continue
+        email = row[email_column].strip().lower()
+        day = row[day_column]
+        day_of_week = days[day] if day in days else days.setdefault(day, parse_day(day))
+        period = row[period_column].strip()
+        lesson = (row[subject_column].strip(), row[year_group_column].strip())
+
+        if not email:
+            errors.append((line, 'Missing teacher email.'))
+            continue
+        if day_of_week is None:
+            errors.append((line, f"Unknown day '{day}'."))
+            continue
+        if not period.isdigit() or not 0 < int(period) < PERIOD_BITS:
+            errors.append((line, f"Period must be a number from 1 to {PERIOD_BITS - 1}, not '{period}'."))
+            continue
+        if not all(lesson):
+            errors.append((line, 'Missing subject or year group.'))
+            continue
+
+        key = (email, day_of_week, int(period))
+        if key in wanted and wanted[key][0] != lesson:
+            other_lesson, other_line = wanted[key]
+            errors.append((line, f'{email} is already teaching {other_lesson[0]} {other_lesson[1]} in this '
+                                 f'period (line {other_line}).'))
+            continue
+        wanted.setdefault(key, (lesson, line))
+
+    teacher_ids = dict(db.session.execute(
+        db.select(db.func.lower(User.email), User.id).where(db.func.lower(User.email).in_({key[0] for key in wanted}))
+    ).all()) if wanted else {}
+
+    slots = {}
+    for (email, day_of_week, period_number), (lesson, line) in wanted.items():
+        if email not in teacher_ids:
+            errors.append((line, f'No user with email {email}.'))
+            continue
+        slots[(teacher_ids[email], day_of_week, period_number)] = lesson
+
+    errors.sort()
+    return rows, slots, errors
+
+
+# ---------------- Diff ------------------
+# Compares the wanted slots with the current timetable (one query) and
+# returns the rows to insert and update, the slots the file no longer lists,
+# and the number already matching. Slots are keyed by (teacher_id,
+# day_of_week, period_number); lessons are (subject, year_group). Where the
+# table holds several slots for one key, the lowest id is diffed and the
+# others are returned as removed, so a prune clears the duplicates.
+def diff_timetable(slots, lesson_ids):
+    # Plain column tuples straight from the connection; no ORM row processing is needed here
+    current = {}
+    duplicates = []
+    for slot_id, teacher_id, day_of_week, period_number, lesson_id in db.session.connection().execute(
+        db.select(TeachingSlot.id, TeachingSlot.teacher_id, TeachingSlot.day_of_week, TeachingSlot.period_number,
+                  TeachingSlot.lesson_id).order_by(TeachingSlot.id)
+    ):
+        key = (teacher_id, day_of_week, period_number)
+        if key not in current:
+            current[key] = (slot_id, lesson_id)
+        else:
+            duplicates.append((slot_id, key, lesson_id))
+
+    added, changed, unchanged = [], [], 0
+    for key, lesson in slots.items():
+        lesson_id = lesson_ids.get(lesson)
+        existing = current.pop(key, None)
+        if existing is None:
+            added.append((key, lesson))
+        elif existing[1] != lesson_id or lesson_id is None:
+            changed.append((existing[0], key, existing[1], lesson))
+        else:
+            unchanged += 1
+
+    removed = [(slot_id, key, lesson_id) for key, (slot_id, lesson_id) in current.items()] + duplicates
+    return added, changed, unchanged, removed
+
+
+def _lesson_ids():
+    lesson_ids = {}
+    for lesson_id, subject, year_group in db.session.execute(
+        db.select(Lesson.id, Lesson.subject, Lesson.year_group).order_by(Lesson.id)
+    ):
+        lesson_ids.setdefault((subject, year_group), lesson_id)
+    return lesson_ids
+
+
+def _executemany(statement, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(statement, rows[start:start + batch_size])
+
+
+# ---------------- Import ------------------
+# Reads, checks and diffs the CSV, then (unless dry_run) writes the whole
+# change in one transaction: new lessons, inserted slots and re-pointed
+# slots in executemany batches. Slots the file no longer lists are returned
+# as removed; with prune they are deleted too, except those that cover
+# assignments or partial-day leave still refer to (returned as kept).
+# Raises TimetableImportError, writing nothing, if any row is invalid or clashes.
+def import_timetable(stream, dry_run=False, prune=False, batch_size=5000):
+    rows, slots, errors = read_timetable(stream)
+    if errors:
+        raise TimetableImportError(errors)
+
+    lesson_ids = _lesson_ids()
+    new_lessons = sorted({lesson for lesson in slots.values() if lesson not in lesson_ids})
+    added, changed, unchanged, removed = diff_timetable(slots, lesson_ids)
+
+    kept = []
+    if prune and removed:
+        # Deleting these would orphan a cover or empty a partial-day leave, so it needed no cover
+        referenced = set(db.session.execute(
+            db.select(CoverAssignment.teaching_slot_id)
+            .union(db.select(LeaveRequestSlot.teaching_slot_id))
+        ).scalars())
+        kept = [slot for slot in removed if slot[0] in referenced]
+        removed = [slot for slot in removed if slot[0] not in referenced]
+
+    result = ImportResult(rows, added, changed, unchanged, removed, kept, new_lessons, prune and not dry_run)
+    if dry_run or not (added or changed or (prune and removed)):
+        return result
+
+    # Core statements on the tables: plain executemany, without ORM bulk processing
+    slots_table = TeachingSlot.__table__
+    try:
+        if new_lessons:
+            _executemany(db.insert(Lesson.__table__), [
+                {'subject': subject, 'year_group': year_group} for subject, year_group in new_lessons
+            ], batch_size)
+            lesson_ids = _lesson_ids()
+
+        _executemany(db.insert(slots_table), [
+            {'teacher_id': teacher_id, 'day_of_week': day_of_week, 'period_number': period_number,
+             'lesson_id': lesson_ids[lesson]}
+            for (teacher_id, day_of_week, period_number), lesson in added
+        ], batch_size)
+        _executemany(
+            db.update(slots_table).where(slots_table.c.id == db.bindparam('slot_id'))
+            .values(lesson_id=db.bindparam('new_lesson_id')),
+            [{'slot_id': slot_id, 'new_lesson_id': lesson_ids[lesson]} for slot_id, _key, _old, lesson in changed],
+            batch_size
+        )
+        removed_ids = [slot_id for slot_id, _key, _lesson_id in removed] if prune else []
+        for start in range(0, len(removed_ids), batch_size):
+            db.session.execute(db.delete(TeachingSlot).where(
+                TeachingSlot.id.in_(removed_ids[start:start + batch_size])
+            ))
+
+        # Core and bulk writes skip the ORM events, so bump the timetable version here
+        bump_data_version(TIMETABLE)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
@@ -0,0 +1,155 @@
+import threading
+from array import array
+from collections import defaultdict
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+from app import db
+from app.models import TeachingSlot, Lesson
+from app.data_version import TIMETABLE, get_data_version, on_data_version_change
+
+# Each day of the week gets a fixed block of bits in a teacher's mask, so
+# (day_of_week, period_number) maps to bit day_of_week * PERIOD_BITS + period_number.
+PERIOD_BITS = 16
+
+
+def slot_bit(day_of_week, period_number):
+    return 1 << (day_of_week * PERIOD_BITS + period_number)
+
+
+# ---------------- Timetable Snapshot ------------------
+# The whole weekly timetable at one DataVersion, held in compact arrays:
+#  - masks: one integer bitmask per teacher marking every (day_of_week, period_number) they teach
+#  - teaching: (day_of_week, period_number) -> array of teacher ids teaching then
+#  - slots: parallel arrays of slot id, day, period and lesson (an index into lessons),
+#    with by_teacher_day[(teacher_id, day_of_week)] -> positions into them in slot id order
+# If the timetable has more than max_slots slots only the masks and teaching
+# arrays are kept (complete is False) and callers fall back to querying slots.
+class TimetableSnapshot:
+    def __init__(self, version, rows, max_slots):
+        self.version = version
+        self.masks = {}
+        self.teaching = defaultdict(lambda: array('l'))
+        self.complete = True
+
+        self.slot_ids = array('l')
+        self.days = array('b')
+        self.periods = array('b')
+        self.lesson_indexes = array('l')
+        self.lessons = []
+        self.by_teacher_day = defaultdict(lambda: array('l'))
+        lesson_positions = {}
+
+        for slot_id, teacher_id, day_of_week, period_number, subject, year_group in rows:
+            self.masks[teacher_id] = self.masks.get(teacher_id, 0) | slot_bit(day_of_week, period_number)
+            self.teaching[(day_of_week, period_number)].append(teacher_id)
+            if not self.complete:
+                continue
+            if len(self.slot_ids) >= max_slots:
+                self._drop_slots()
+                continue
+
+            lesson = (subject, year_group)
+            if lesson not in lesson_positions:
+                lesson_positions[lesson] = len(self.lessons)
+                self.lessons.append(lesson)
+            self.by_teacher_day[(teacher_id, day_of_week)].append(len(self.slot_ids))
+            self.slot_ids.append(slot_id)
+            self.days.append(day_of_week)
+            self.periods.append(period_number)
+            self.lesson_indexes.append(lesson_positions[lesson])
+
+    def _drop_slots(self):
+        self.complete = False
+        self.slot_ids = self.days = self.periods = self.lesson_indexes = None
+        self.lessons = None
+        self.by_teacher_day = None
+
+    def slots_on(self, teacher_id, day_of_week):
+        # [(slot_id, day_of_week, period_number, subject, year_group), ...] in slot id order
+        positions = self.by_teacher_day.get((teacher_id, day_of_week), ())
+        return [
+            (self.slot_ids[position], self.days[position], self.periods[position])
+            + self.lessons[self.lesson_indexes[position]]
+            for position in positions
+        ]
+
+
+# ---------------- Timetable Index ------------------
+# Holds the current snapshot. It is rebuilt lazily, with one query, when this
+# process commits a timetable change or the shared DataVersion row shows that
+# another process has; the version is checked at most once per request.
+class TimetableIndex:
+    def __init__(self, max_slots):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stale = True
+        self.max_slots = max_slots
+
+    def invalidate(self):
+        with self._lock:
+            self._stale = True
+
+    def build(self):
+        # The version is read before the rows, so a snapshot is never newer than its label
+        version = get_data_version(TIMETABLE, refresh=True)
+        rows = db.session.execute(
+            db.select(TeachingSlot.id, TeachingSlot.teacher_id, TeachingSlot.day_of_week,
+                      TeachingSlot.period_number, Lesson.subject, Lesson.year_group)
+            .outerjoin(Lesson, TeachingSlot.lesson_id == Lesson.id)
+            .order_by(TeachingSlot.id)
+            .execution_options(yield_per=10000)
+        )
+        snapshot = TimetableSnapshot(version, rows, self.max_slots)
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._stale = False
+        return snapshot
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None or self._stale or snapshot.version != get_data_version(TIMETABLE):
+            snapshot = self.build()
+        return snapshot
+
+    def ensure_built(self):
+        self.snapshot()
+
+    def busy_mask(self, teacher_id):
+        return self.snapshot().masks.get(teacher_id, 0)
+
+    def is_free(self, teacher_id, day_of_week, period_number):
+        return not self.busy_mask(teacher_id) & slot_bit(day_of_week, period_number)
+
+    def periods_taught(self, teacher_id, day_of_week):
+        day_mask = (self.busy_mask(teacher_id) >> (day_of_week * PERIOD_BITS)) & ((1 << PERIOD_BITS) - 1)
+        return bin(day_mask).count('1')
+
+    def teaching_at(self, day_of_week, period_number):
+        return self.snapshot().teaching.get((day_of_week, period_number), ())
+
+    def free_teachers(self, teacher_ids, day_of_week, period_number):
+        bit = slot_bit(day_of_week, period_number)
+        masks = self.snapshot().masks
+        return [teacher_id for teacher_id in teacher_ids if not masks.get(teacher_id, 0) & bit]
+
+
+def _current_index():
+    # One index per application, so apps bound to different databases never share one
+    index = current_app.extensions.get('timetable_index')
+    if index is None:
+        index = current_app.extensions.setdefault(
+            'timetable_index', TimetableIndex(current_app.config['TIMETABLE_CACHE_MAX_SLOTS'])
+        )
+    return index
+
+
+timetable_index = LocalProxy(_current_index)
+
+
+# ---------------- Keeping the index current ------------------
+# Any TeachingSlot or Lesson write bumps the 'timetable' DataVersion in the
+# same transaction; once it commits, this process drops its snapshot too.
+on_data_version_change(TIMETABLE, lambda: timetable_index.invalidate())
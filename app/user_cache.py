@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+from app.models import User
+
+
+# The fields Flask-Login and the templates read from current_user, detached from any session
+class CachedUser(UserMixin):
+    def __init__(self, id, email, role, first_name, last_name, department_id):
+        self.id = id
+        self.email = email
+        self.role = role
+        self.first_name = first_name
+        self.last_name = last_name
+        self.department_id = department_id
+
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def is_teacher(self):
+        return self.role == 'teacher'
+
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+
+# ---------------- User cache ------------------
+# Per-process LRU of CachedUser entries, each kept for at most `ttl` seconds.
+# Updates and deletes made through the ORM evict the user straight away; the
+# TTL bounds staleness for changes made any other way (bulk updates, other
+# processes).
+class UserCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (expires_at, CachedUser)
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+
+    def put(self, user):
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+def get_user_cache():
+    # One cache per application, sized from USER_CACHE_SIZE and USER_CACHE_TTL
+    cache = current_app.extensions.get('user_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('user_cache', UserCache(
+            current_app.config['USER_CACHE_SIZE'], current_app.config['USER_CACHE_TTL']
+        ))
+    return cache
+
+
+def load_cached_user(user_id):
+    cache = get_user_cache()
+    user = cache.get(user_id)
+    if user is not None:
+        return user
+
+    row = db.session.execute(
+        db.select(User.id, User.email, User.role, User.first_name, User.last_name, User.department_id)
+        .where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+    user = CachedUser(*row)
+    cache.put(user)
+    return user
+
+
+# ---------------- Invalidation ------------------
+# A changed user is evicted as soon as the change is flushed, and again once
+# it commits, so a request that reloads the old row in between cannot keep it.
+def _user_changed(mapper, connection, target):
+    if has_app_context():
+        get_user_cache().invalidate(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_users', set()).add(target.id)
+
+
+event.listen(User, 'after_update', _user_changed)
+event.listen(User, 'after_delete', _user_changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_changed_users(session):
+    user_ids = session.info.pop('changed_users', None)
+    if user_ids and has_app_context():
+        cache = get_user_cache()
+        for user_id in user_ids:
+            cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_users', None)
@@ -0,0 +1,110 @@
+from collections import Counter
+from datetime import date, timedelta
+
+from sqlalchemy import or_, and_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import User, CoverAssignment, CoverWorkload
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def term_start(day):
+    # Autumn term from September, spring from January, summer from April
+    if day.month >= 9:
+        return date(day.year, 9, 1)
+    if day.month >= 4:
+        return date(day.year, 4, 1)
+    return date(day.year, 1, 1)
+
+
+def workload_buckets(day):
+    return [('day', day), ('week', week_start(day)), ('term', term_start(day))]
+
+
+def _upsert(rows):
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(CoverWorkload)
+    return db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=['teacher_id', 'bucket', 'bucket_start'],
+            set_={'cover_count': CoverWorkload.cover_count + statement.excluded.cover_count}
+        ),
+        rows
+    )
+
+
+# ---------------- Incremental updates ------------------
+# covers: iterable of (covering_teacher_id, date); delta is +1 for new cover
+# assignments and -1 for deleted ones. Runs inside the caller's transaction.
+def record_cover_workload(covers, delta=1):
+    counts = Counter()
+    for teacher_id, day in covers:
+        if day is None:
+            continue
+        for bucket, bucket_start in workload_buckets(day):
+            counts[(teacher_id, bucket, bucket_start)] += delta
+
+    rows = [
+        {'teacher_id': teacher_id, 'bucket': bucket, 'bucket_start': bucket_start, 'cover_count': count}
+        for (teacher_id, bucket, bucket_start), count in counts.items() if count
+    ]
+    if rows:
+        _upsert(rows)
+
+
+def rebuild_workload():
+    db.session.execute(db.delete(CoverWorkload))
+
+    counts = Counter()
+    rows = db.session.execute(
+        db.select(CoverAssignment.covering_teacher_id, CoverAssignment.date, db.func.count())
+        .where(CoverAssignment.date.is_not(None))
+        .group_by(CoverAssignment.covering_teacher_id, CoverAssignment.date)
+    ).all()
+    for teacher_id, day, count in rows:
+        for bucket, bucket_start in workload_buckets(day):
+            counts[(teacher_id, bucket, bucket_start)] += count
+
+    if counts:
+        db.session.execute(db.insert(CoverWorkload), [
+            {'teacher_id': teacher_id, 'bucket': bucket, 'bucket_start': bucket_start, 'cover_count': count}
+            for (teacher_id, bucket, bucket_start), count in counts.items()
+        ])
+    db.session.commit()
+    return len(counts)
+
+
+# ---------------- Reads ------------------
+# Every day, week and term bucket touching the range for the given teachers,
+# as {(teacher_id, bucket, bucket_start): covers}
+def get_workload(teacher_ids, start_date, end_date):
+    rows = db.session.execute(
+        db.select(CoverWorkload.teacher_id, CoverWorkload.bucket, CoverWorkload.bucket_start,
+                  CoverWorkload.cover_count)
+        .where(
+            CoverWorkload.teacher_id.in_(teacher_ids),
+            or_(
+                and_(CoverWorkload.bucket == 'day', CoverWorkload.bucket_start.between(start_date, end_date)),
+                and_(CoverWorkload.bucket == 'week',
+                     CoverWorkload.bucket_start.between(week_start(start_date), week_start(end_date))),
+                and_(CoverWorkload.bucket == 'term',
+                     CoverWorkload.bucket_start.between(term_start(start_date), term_start(end_date)))
+            )
+        )
+    ).all()
+    return {(teacher_id, bucket, bucket_start): count for teacher_id, bucket, bucket_start, count in rows}
+
+
+def get_busiest_teachers(bucket, bucket_start, limit=10):
+    return db.session.execute(
+        db.select(User.first_name, User.last_name, CoverWorkload.cover_count)
+        .join(User, CoverWorkload.teacher_id == User.id)
+        .where(CoverWorkload.bucket == bucket, CoverWorkload.bucket_start == bucket_start,
+               CoverWorkload.cover_count > 0)
+        .order_by(CoverWorkload.cover_count.desc())
+        .limit(limit)
+    ).all()
@@ -0,0 +1,40 @@
+"""Add cover assignment period and conflict constraints
+
+Revision ID: a47c3e90d215
+Revises: 5e1d8b2a9c47
+Create Date: 2026-10-18 12:40:13.927550
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a47c3e90d215'
+down_revision = '5e1d8b2a9c47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('cover_assignment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('period_number', sa.Integer(), nullable=True))
+
+    # Backfill the denormalised period from the covered teaching slot
+    op.execute(
+        'UPDATE cover_assignment SET period_number = ('
+        'SELECT teaching_slot.period_number FROM teaching_slot '
+        'WHERE teaching_slot.id = cover_assignment.teaching_slot_id)'
+    )
+
+    with op.batch_alter_table('cover_assignment', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_cover_assignment_slot_date', ['teaching_slot_id', 'date'])
+        batch_op.create_unique_constraint('uq_cover_assignment_teacher_period',
+                                          ['covering_teacher_id', 'date', 'period_number'])
+
+
+def downgrade():
+    with op.batch_alter_table('cover_assignment', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_cover_assignment_teacher_period', type_='unique')
+        batch_op.drop_constraint('uq_cover_assignment_slot_date', type_='unique')
+        batch_op.drop_column('period_number')
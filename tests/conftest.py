@@ -0,0 +1,103 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from flask import g
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.config import Config
+from app.models import User, Department, Lesson, TeachingSlot
+
+MONDAY = date(2030, 1, 7)
+
+
+@pytest.fixture
+def app(tmp_path):
+    # A fresh SQLite file per test, built from the models rather than the migrations
+    class TestConfig(Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'school.db'}"
+        JOB_RESULT_DIR = str(tmp_path / 'job_results')
+        PROFILE_DIR = str(tmp_path / 'profiles')
+
+    app = create_app(TestConfig)
+
+    # Requests reuse the test's app context, so drop what they left on g (the
+    # logged-in user, data versions) as a fresh context per request would
+    @app.teardown_request
+    def reset_globals(_error):
+        g.__dict__.clear()
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def logged_in(app, email):
+    client = app.test_client()
+    client.post('/login', data={'email': email, 'password': 'password'})
+    return client
+
+
+@pytest.fixture
+def admin_client(app, school):
+    return logged_in(app, 'admin@example.com')
+
+
+@pytest.fixture
+def teacher_client(app, school):
+    return logged_in(app, 'maths@example.com')
+
+
+# ---------------- School fixture ------------------
+# Two departments and five teachers over Monday and Tuesday:
+#   absent: Maths, teaches Mon P1, Mon P2 and Tue P1
+#   maths:  Maths, teaches Mon P1
+#   science: Science, teaches Mon P2
+#   free:   Science, teaches nothing
+#   late:   Maths, teaches Tue P2
+# slots maps (teacher, day_of_week, period_number) to the TeachingSlot id.
+@pytest.fixture
+def school(app):
+    maths, science = Department(name='Maths'), Department(name='Science')
+    db.session.add_all([maths, science])
+    db.session.flush()
+
+    # One cheap hash shared by every user, as the seed does
+    password_hash = generate_password_hash('password', method='pbkdf2:sha256:1000')
+    admin = User(email='admin@example.com', password_hash=password_hash, role='admin', first_name='Admin',
+                 last_name='User')
+    db.session.add(admin)
+
+    teachers = {}
+    for name, department in [('absent', maths), ('maths', maths), ('science', science), ('free', science),
+                             ('late', maths)]:
+        teachers[name] = User(email=f'{name}@example.com', password_hash=password_hash, role='teacher',
+                              first_name=name.title(), last_name='Teacher', department_id=department.id)
+    db.session.add_all(teachers.values())
+
+    lessons = {year_group: Lesson(subject='Maths', year_group=year_group)
+               for year_group in ('Year 7', 'Year 8', 'Year 9')}
+    db.session.add_all(lessons.values())
+    db.session.flush()
+
+    timetable = [('absent', 0, 1, 'Year 7'), ('absent', 0, 2, 'Year 8'), ('absent', 1, 1, 'Year 9'),
+                 ('maths', 0, 1, 'Year 8'), ('science', 0, 2, 'Year 7'), ('late', 1, 2, 'Year 9')]
+    slots = {}
+    for name, day_of_week, period_number, year_group in timetable:
+        slot = TeachingSlot(teacher_id=teachers[name].id, day_of_week=day_of_week, period_number=period_number,
+                            lesson_id=lessons[year_group].id)
+        db.session.add(slot)
+        slots[(name, day_of_week, period_number)] = slot
+    db.session.commit()
+
+    return SimpleNamespace(
+        admin=admin.id,
+        departments={'maths': maths.id, 'science': science.id},
+        teachers={name: teacher.id for name, teacher in teachers.items()},
+        slots={key: slot.id for key, slot in slots.items()},
+    )
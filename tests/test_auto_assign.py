@@ -0,0 +1,59 @@
+import pytest
+
+from app import db
+from app.models import LeaveRequest, Job
+
+from conftest import MONDAY
+
+
+@pytest.fixture
+def absence(school):
+    leave_request = LeaveRequest(user_id=school.teachers['absent'], start_date=MONDAY, end_date=MONDAY,
+                                 status='approved', reason='Personal')
+    db.session.add(leave_request)
+    db.session.commit()
+    return leave_request.id
+
+
+def test_only_admins_can_auto_assign(absence, teacher_client, admin_client):
+    response = teacher_client.get(f'/api/auto-assign/{absence}')
+    assert response.status_code == 403
+
+    response = admin_client.get(f'/api/auto-assign/{absence}')
+    assert response.status_code == 200
+    assert len(response.json['assignments']) + len(response.json['unfilled']) == 2
+
+
+def job_count():
+    return db.session.execute(db.select(db.func.count(Job.id))).scalar()
+
+
+def test_gets_never_queue_auto_assign_jobs(app, absence, admin_client):
+    app.config['AUTO_ASSIGN_ASYNC_DAYS'] = 0  # Every absence is solved in the background
+
+    response = admin_client.get(f'/api/auto-assign/{absence}')
+    assert (response.status_code, response.headers['Allow']) == (405, 'POST')
+    page = admin_client.get(f'/assign-cover/{absence}?auto=1').text
+    assert f'action="/assign-cover/{absence}/auto-assign" method="POST"' in page
+    assert job_count() == 0
+
+    response = admin_client.post(f'/api/auto-assign/{absence}')
+    assert response.status_code == 202
+    job_id = response.json['job_id']
+    # Now a GET reports the queued job, and the form link shows its progress
+    assert admin_client.get(f'/api/auto-assign/{absence}').json['job_id'] == job_id
+    response = admin_client.get(f'/assign-cover/{absence}?auto=1')
+    assert response.headers['Location'].endswith(f'/assign-cover/{absence}?job={job_id}')
+    assert job_count() == 1
+
+
+def test_auto_assign_button_queues_a_job(app, absence, teacher_client, admin_client):
+    app.config['AUTO_ASSIGN_ASYNC_DAYS'] = 0
+
+    teacher_client.post(f'/assign-cover/{absence}/auto-assign')
+    assert job_count() == 0
+
+    response = admin_client.post(f'/assign-cover/{absence}/auto-assign')
+    job = db.session.execute(db.select(Job)).scalar_one()
+    assert response.headers['Location'].endswith(f'/assign-cover/{absence}?job={job.id}')
+    assert (job.kind, job.status) == ('auto_assign', 'queued')
@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+import pytest
+
+from app import db
+from app.availability import get_slot_teacher_mapping_sql
+from app.helpers import get_slot_teacher_mapping, get_leave_teaching_slots, set_leave_slots
+from app.models import LeaveRequest, CoverAssignment
+
+from conftest import MONDAY
+
+TUESDAY = MONDAY + timedelta(days=1)
+
+
+def leave(school, teacher, start, end, status='approved', lessons=()):
+    leave_request = LeaveRequest(user_id=school.teachers[teacher], start_date=start, end_date=end, status=status,
+                                 reason='Personal')
+    db.session.add(leave_request)
+    db.session.flush()
+    if lessons:
+        set_leave_slots(leave_request, [f'{school.slots[slot]}:{day.isoformat()}' for slot, day in lessons])
+    db.session.commit()
+    return leave_request
+
+
+# Around the absent teacher's Monday and Tuesday:
+#  - free is away all of Tuesday
+#  - science is away only for their own first Monday P2 lesson (of two in the range)
+#  - late is covering science's Monday P2
+#  - maths asked for Monday off, but it is still pending
+@pytest.fixture
+def absences(school):
+    leave(school, 'free', TUESDAY, TUESDAY)
+    leave(school, 'science', MONDAY, MONDAY + timedelta(weeks=1), lessons=[(('science', 0, 2), MONDAY)])
+    leave(school, 'maths', MONDAY, MONDAY, status='pending')
+    db.session.add(CoverAssignment(absent_teacher_id=school.teachers['science'],
+                                   covering_teacher_id=school.teachers['late'],
+                                   teaching_slot_id=school.slots[('science', 0, 2)], date=MONDAY, period_number=2))
+    db.session.commit()
+    return school
+
+
+def offered(school, mapping):
+    names = {teacher_id: name for name, teacher_id in school.teachers.items()}
+    return {slot_id: sorted(names[teacher['id']] for teacher in teachers) for slot_id, teachers in mapping.items()}
+
+
+def test_engines_agree_on_whole_day_leave(absences):
+    leave_request = leave(absences, 'absent', MONDAY, TUESDAY)
+    mapping = get_slot_teacher_mapping(leave_request)
+
+    assert get_slot_teacher_mapping_sql(leave_request) == mapping
+    assert offered(absences, mapping) == {
+        absences.slots[('absent', 0, 1)]: ['free', 'late', 'science'],
+        absences.slots[('absent', 0, 2)]: ['free', 'maths'],
+        absences.slots[('absent', 1, 1)]: ['late', 'maths', 'science'],
+    }
+
+
+def test_engines_agree_on_partial_day_leave(absences):
+    leave_request = leave(absences, 'absent', MONDAY, TUESDAY, lessons=[(('absent', 0, 2), MONDAY)])
+    mapping = get_slot_teacher_mapping(leave_request)
+
+    assert get_slot_teacher_mapping_sql(leave_request) == mapping
+    assert offered(absences, mapping) == {absences.slots[('absent', 0, 2)]: ['free', 'maths']}
+
+
+def test_engines_agree_over_several_weeks(absences):
+    # The second Monday has no covers or partial leave, so science and late are free then
+    leave_request = leave(absences, 'absent', MONDAY, MONDAY + timedelta(weeks=1))
+    teaching_slots = get_leave_teaching_slots(leave_request)
+    mapping = get_slot_teacher_mapping(leave_request, teaching_slots)
+
+    assert get_slot_teacher_mapping_sql(leave_request, teaching_slots) == mapping
+    assert get_slot_teacher_mapping_sql(leave_request) == mapping
+    assert offered(absences, mapping)[absences.slots[('absent', 0, 2)]] == ['free', 'maths']
@@ -0,0 +1,81 @@
+import re
+from datetime import timedelta
+
+from app import db
+from app.helpers import insert_cover_assignments
+from app.models import LeaveRequest, CoverAssignment
+
+from conftest import MONDAY
+
+
+def cover(school, teacher, slot, day=MONDAY, absent='absent'):
+    return {'absent_teacher_id': school.teachers[absent], 'covering_teacher_id': school.teachers[teacher],
+            'teaching_slot_id': school.slots[slot], 'date': day, 'period_number': slot[2]}
+
+
+def test_inserts_a_clean_batch(school):
+    rows = [cover(school, 'free', ('absent', 0, 1)), cover(school, 'late', ('absent', 0, 2))]
+    assert insert_cover_assignments(rows) == {}
+    db.session.commit()
+    assert db.session.execute(db.select(db.func.count(CoverAssignment.id))).scalar() == 2
+
+
+def test_same_lesson_twice_in_a_batch(school):
+    rows = [cover(school, 'free', ('absent', 0, 1)), cover(school, 'late', ('absent', 0, 1))]
+    assert insert_cover_assignments(rows) == {1: 'This lesson is already being covered in this batch.'}
+
+
+def test_teacher_double_booked_in_a_batch(school):
+    rows = [cover(school, 'free', ('absent', 0, 1)), cover(school, 'free', ('maths', 0, 1), absent='maths')]
+    assert insert_cover_assignments(rows) == {1: 'This teacher is already covering another class in this period.'}
+
+
+def test_teacher_teaching_their_own_class(school):
+    rows = [cover(school, 'maths', ('absent', 0, 1))]
+    assert insert_cover_assignments(rows) == {0: 'This teacher is teaching their own class in this period.'}
+
+
+def test_clashes_with_existing_assignments(school):
+    assert insert_cover_assignments([cover(school, 'free', ('absent', 0, 1))]) == {}
+    db.session.commit()
+
+    rows = [
+        cover(school, 'late', ('absent', 0, 1)),  # Lesson already covered
+        cover(school, 'free', ('maths', 0, 1), absent='maths'),  # Teacher already covering then
+        cover(school, 'free', ('absent', 0, 1), day=MONDAY + timedelta(weeks=1)),  # Another week: fine
+    ]
+    assert insert_cover_assignments(rows) == {
+        0: 'This lesson already has cover assigned.',
+        1: 'This teacher is already covering another class in this period.',
+    }
+    db.session.rollback()
+    assert db.session.execute(db.select(db.func.count(CoverAssignment.id))).scalar() == 1
+
+
+def test_tampered_cover_form_is_a_row_error(school, admin_client):
+    leave_request = LeaveRequest(user_id=school.teachers['absent'], start_date=MONDAY, end_date=MONDAY,
+                                 status='approved', reason='Personal')
+    db.session.add(leave_request)
+    db.session.commit()
+    url = f'/assign-cover/{leave_request.id}'
+
+    html = admin_client.get(url).text
+    data = dict(re.findall(r'name="(slots-\d+-(?:slot_id|date))"[^>]*value="([^"]*)"', html))
+    for name in re.findall(r'name="(slots-\d+-covering_teacher)"', html):
+        data[name] = str(school.teachers['free'])
+    assert len(data) == 6
+
+    tampered = [
+        ('slots-0-slot_id', 'abc'), ('slots-0-slot_id', ''), ('slots-0-date', '2030-13-45'),
+        ('slots-0-date', (MONDAY + timedelta(weeks=1)).isoformat()),  # Outside the leave
+        ('slots-0-date', (MONDAY + timedelta(days=1)).isoformat()),  # Not the slot's weekday
+        ('slots-0-slot_id', str(school.slots[('maths', 0, 1)])),  # Another teacher's lesson
+    ]
+    for field, value in tampered:
+        response = admin_client.post(url, data=dict(data, **{field: value}))
+        assert response.status_code == 200
+        assert 'This lesson could not be read.' in response.text
+    assert db.session.execute(db.select(db.func.count(CoverAssignment.id))).scalar() == 0
+
+    assert admin_client.post(url, data=data).status_code == 302
+    assert db.session.execute(db.select(db.func.count(CoverAssignment.id))).scalar() == 2
@@ -0,0 +1,103 @@
+import itertools
+import random
+from collections import Counter
+from datetime import timedelta
+
+from app.cover_solver import MinCostFlow, solve_cover
+
+from conftest import MONDAY
+
+
+# Per-teacher costs in place of the workload tables and timetable; each
+# recorded cover adds 10 to the teacher's load on later days
+class StubCosts:
+    def __init__(self, loads, departments):
+        self.loads = loads
+        self.departments = departments
+        self.recorded = Counter()
+
+    def load_cost(self, teacher_id, day):
+        return self.loads[teacher_id] + 10 * self.recorded[teacher_id]
+
+    def department_cost(self, teacher_id, department_id):
+        return 0 if self.departments[teacher_id] == department_id else 5
+
+    def marginal_cost(self, covers_today):
+        return 8 * covers_today
+
+    def record(self, teacher_id, day):
+        self.recorded[teacher_id] += 1
+
+
+def plan_cost(costs, slots, assignment):
+    total, covers = 0, Counter()
+    for key, teacher_id in assignment.items():
+        day, _period_number, department_id = slots[key]
+        total += costs.load_cost(teacher_id, day) + costs.department_cost(teacher_id, department_id)
+        total += costs.marginal_cost(covers[teacher_id])
+        covers[teacher_id] += 1
+    return total
+
+
+def best_plan(costs, slots, candidates):
+    # (-slots filled, cost) of the best plan, by trying every one
+    keys = list(slots)
+    best = None
+    for choice in itertools.product(*[[None] + candidates[key] for key in keys]):
+        assignment = {key: teacher_id for key, teacher_id in zip(keys, choice) if teacher_id is not None}
+        periods = [(teacher_id, slots[key][1]) for key, teacher_id in assignment.items()]
+        if len(set(periods)) < len(periods):
+            continue
+        score = (-len(assignment), plan_cost(costs, slots, assignment))
+        if best is None or score < best:
+            best = score
+    return best
+
+
+def test_min_cost_flow_assignment():
+    # Three workers, three jobs: the cheapest perfect matching costs 1 + 2 + 2
+    cost = [[4, 1, 3], [2, 0, 5], [3, 2, 2]]
+    flow = MinCostFlow(8)
+    source, sink = 6, 7
+    edges = {}
+    for worker in range(3):
+        flow.add_edge(source, worker, 1, 0)
+        flow.add_edge(3 + worker, sink, 1, 0)
+        for job in range(3):
+            edges[(worker, job)] = flow.add_edge(worker, 3 + job, 1, cost[worker][job])
+
+    assert flow.solve(source, sink) == 3
+    chosen = sorted(key for key, edge in edges.items() if edge[1] == 0)
+    assert chosen == [(0, 1), (1, 0), (2, 2)]
+    assert sum(cost[worker][job] for worker, job in chosen) == 5
+
+
+def test_solve_cover_fills_every_slot_it_can():
+    slots = {'a': (MONDAY, 1, 1), 'b': (MONDAY, 1, 1), 'c': (MONDAY, 2, 1)}
+    candidates = {'a': [10], 'b': [10, 11], 'c': []}
+    assignment = solve_cover(slots, candidates, StubCosts({10: 0, 11: 50}, {10: 1, 11: 2}))
+    # 10 is cheaper but can only take one of the period 1 slots
+    assert assignment == {'a': 10, 'b': 11}
+
+
+def test_solve_cover_is_optimal_against_brute_force():
+    rng = random.Random(7)
+    for _trial in range(100):
+        teachers = list(range(rng.randint(2, 5)))
+        slots = {index: (MONDAY, rng.randint(1, 3), rng.randint(1, 2)) for index in range(rng.randint(1, 5))}
+        candidates = {key: rng.sample(teachers, rng.randint(0, len(teachers))) for key in slots}
+        loads = {teacher_id: rng.randint(0, 12) for teacher_id in teachers}
+        departments = {teacher_id: rng.randint(1, 2) for teacher_id in teachers}
+
+        assignment = solve_cover(slots, candidates, StubCosts(loads, departments))
+        costs = StubCosts(loads, departments)
+        assert (-len(assignment), plan_cost(costs, slots, assignment)) == best_plan(costs, slots, candidates)
+
+
+def test_solve_cover_carries_load_to_later_days():
+    tuesday = MONDAY + timedelta(days=1)
+    slots = {'monday': (MONDAY, 1, 1), 'tuesday': (tuesday, 1, 1)}
+    candidates = {'monday': [10, 11], 'tuesday': [10, 11]}
+    # 10 starts cheaper; after covering Monday its load rises past 11's
+    assignment = solve_cover(slots, candidates, StubCosts({10: 0, 11: 5}, {10: 1, 11: 1}))
+    assert assignment == {'monday': 10, 'tuesday': 11}
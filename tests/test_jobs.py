@@ -0,0 +1,114 @@
+from datetime import timedelta
+
+import pytest
+
+from app import db
+from app.jobs import JOBS, JobFailed, enqueue_job, claim_jobs, run_job, _now
+from app.models import Job
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    # Test-only job kinds; calls records each attempt's params
+    calls = []
+
+    def flaky(context, fail):
+        calls.append(fail)
+        if fail == 'retry':
+            raise RuntimeError('Database went away')
+        if fail == 'fatal':
+            raise JobFailed('Leave request 1 no longer exists.')
+        return {'attempt': context.attempt}
+
+    monkeypatch.setitem(JOBS, 'test_flaky', (flaky, 2))
+    return calls
+
+
+def queue(fail):
+    job = enqueue_job('test_flaky', {'fail': fail})
+    db.session.commit()
+    return job.id
+
+
+def load(job_id):
+    db.session.expire_all()
+    return db.session.get(Job, job_id)
+
+
+def make_due(job_id):
+    db.session.execute(db.update(Job).where(Job.id == job_id).values(run_after=_now() - timedelta(seconds=1)))
+    db.session.commit()
+
+
+def test_enqueue_reuses_a_pending_job(app, handlers):
+    assert queue('none') == queue('none')
+    assert queue('none') != queue('retry')
+    with pytest.raises(ValueError):
+        enqueue_job('no_such_kind')
+
+
+def test_claim_is_exclusive(app, handlers):
+    first, second = queue('none'), queue('retry')
+    claimed = claim_jobs('worker-a', 1)
+    assert [job_id for job_id, _token in claimed] == [first]
+    assert [job_id for job_id, _token in claim_jobs('worker-b', 5)] == [second]
+    assert claim_jobs('worker-c', 5) == []
+
+    job = load(first)
+    assert (job.status, job.attempts, job.claimed_by) == ('running', 1, claimed[0][1])
+
+
+def test_success_stores_the_result(app, handlers):
+    job_id = queue('none')
+    [(claimed_id, token)] = claim_jobs('worker', 5)
+    run_job(claimed_id, token)
+
+    job = load(job_id)
+    assert (job.status, job.result, job.claimed_by, job.error) == ('succeeded', '{"attempt": 1}', None, None)
+
+
+def test_failure_is_retried_with_backoff_then_fails(app, handlers):
+    app.config.update(JOB_RETRY_DELAY=30, JOB_RETRY_MAX_DELAY=3600)
+    job_id = queue('retry')
+
+    [(_job_id, token)] = claim_jobs('worker', 5)
+    run_job(job_id, token)
+    job = load(job_id)
+    assert (job.status, job.attempts, job.error) == ('queued', 1, 'Database went away')
+    assert job.run_after > _now() + timedelta(seconds=25)
+    assert claim_jobs('worker', 5) == []  # Not due yet
+
+    make_due(job_id)
+    [(_job_id, token)] = claim_jobs('worker', 5)
+    run_job(job_id, token)
+    job = load(job_id)
+    assert (job.status, job.attempts, job.error) == ('failed', 2, 'Database went away')
+    assert handlers == ['retry', 'retry']
+
+
+def test_job_failed_is_not_retried(app, handlers):
+    job_id = queue('fatal')
+    [(_job_id, token)] = claim_jobs('worker', 5)
+    run_job(job_id, token)
+    job = load(job_id)
+    assert (job.status, job.attempts, job.error) == ('failed', 1, 'Leave request 1 no longer exists.')
+
+
+def test_stale_job_is_reclaimed_and_the_old_token_ignored(app, handlers):
+    job_id = queue('none')
+    [(_job_id, old_token)] = claim_jobs('dead-worker', 5)
+    assert claim_jobs('worker', 5) == []
+
+    # The first worker stops sending heartbeats past the lease
+    lease = timedelta(seconds=app.config['JOB_LEASE_SECONDS'] + 1)
+    db.session.execute(db.update(Job).where(Job.id == job_id).values(heartbeat_at=_now() - lease))
+    db.session.commit()
+    [(_job_id, token)] = claim_jobs('worker', 5)
+    assert token != old_token
+
+    run_job(job_id, old_token)
+    assert load(job_id).status == 'running'
+    run_job(job_id, token)
+    job = load(job_id)
+    assert (job.status, job.attempts, job.result) == ('succeeded', 2, '{"attempt": 2}')
+    assert handlers == ['none']
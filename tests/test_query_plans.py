@@ -0,0 +1,19 @@
+from app import db
+from app.models import LeaveRequest, CoverAssignment
+from app.query_plans import check_query_plans
+
+from conftest import MONDAY
+
+
+def test_hot_queries_use_an_index(school):
+    # An approved absence with cover already saved, so every hot path (including
+    # the conflict query of insert_cover_assignments) runs against the fixture
+    db.session.add(LeaveRequest(user_id=school.teachers['absent'], start_date=MONDAY, end_date=MONDAY,
+                                status='approved', reason='Personal'))
+    db.session.add(CoverAssignment(absent_teacher_id=school.teachers['absent'],
+                                   covering_teacher_id=school.teachers['free'],
+                                   teaching_slot_id=school.slots[('absent', 0, 1)], date=MONDAY, period_number=1))
+    db.session.commit()
+
+    failures = check_query_plans()
+    assert [(name, tables) for name, _statement, tables, _plan in failures] == []
@@ -0,0 +1,57 @@
+import csv
+import io
+import zipfile
+from datetime import timedelta
+
+import pytest
+
+from app import db
+from app.models import LeaveRequest
+from app.reports import generate_csv, generate_xlsx
+
+from conftest import MONDAY
+
+
+# A whole week off, with a reason a spreadsheet would run as a formula
+@pytest.fixture
+def report_leave(school):
+    db.session.add(LeaveRequest(user_id=school.teachers['absent'], start_date=MONDAY,
+                                end_date=MONDAY + timedelta(days=6), status='approved',
+                                reason='=HYPERLINK("http://example.com")'))
+    db.session.commit()
+    return school
+
+
+def test_csv_quotes_formulas(report_leave):
+    rows = list(csv.reader(io.StringIO(''.join(generate_csv('leave')))))
+    assert len(rows) == 2
+    assert '\'=HYPERLINK("http://example.com")' in rows[1]
+    assert '=HYPERLINK("http://example.com")' not in rows[1]
+
+
+def test_xlsx_holds_the_csv_rows(report_leave):
+    chunks = list(generate_xlsx('leave'))
+    assert len(chunks) > 1  # The fixed parts go out before the rows are read
+
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as workbook:
+        assert workbook.testzip() is None
+        assert workbook.read('xl/workbook.xml').count(b'<sheet ') == 1
+        sheet = workbook.read('xl/worksheets/sheet1.xml').decode('utf-8')
+
+    header, _row = list(csv.reader(io.StringIO(''.join(generate_csv('leave')))))
+    assert sheet.count('<row ') == 2
+    assert f'<c r="A1" t="inlineStr"><is><t xml:space="preserve">{header[0]}</t></is></c>' in sheet
+    assert '\'=HYPERLINK("http://example.com")' in sheet
+    assert '>=HYPERLINK' not in sheet
+    assert '<v>5</v>' in sheet  # School days, as a number
+
+
+def test_xlsx_download(report_leave, admin_client, teacher_client):
+    assert teacher_client.get('/reports/leave.xlsx').status_code == 302
+
+    response = admin_client.get(f'/reports/leave.xlsx?from={MONDAY.isoformat()}')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    assert response.headers['Content-Disposition'] == f'attachment; filename=leave_{MONDAY.isoformat()}.xlsx'
+    with zipfile.ZipFile(io.BytesIO(response.data)) as workbook:
+        assert b'HYPERLINK' in workbook.read('xl/worksheets/sheet1.xml')
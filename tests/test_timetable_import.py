@@ -0,0 +1,124 @@
+import io
+from datetime import timedelta
+
+import pytest
+
+from app import db
+from app.models import Lesson, TeachingSlot, LeaveRequest, LeaveRequestSlot, CoverAssignment
+from app.timetable_import import TimetableImportError, import_timetable
+
+from conftest import MONDAY
+
+# The fixture's timetable, as an MIS export would list it
+HEADER = 'Teacher Email,Day,Period,Subject,Year Group\n'
+CURRENT = (
+    'absent@example.com,Monday,1,Maths,Year 7\n'
+    'absent@example.com,Monday,2,Maths,Year 8\n'
+    'absent@example.com,Tuesday,1,Maths,Year 9\n'
+    'maths@example.com,Monday,1,Maths,Year 8\n'
+    'science@example.com,Monday,2,Maths,Year 7\n'
+    'late@example.com,Tuesday,2,Maths,Year 9\n'
+)
+
+
+def run(csv_text, **options):
+    return import_timetable(io.StringIO(HEADER + csv_text), **options)
+
+
+def timetable():
+    return set(db.session.execute(
+        db.select(TeachingSlot.teacher_id, TeachingSlot.day_of_week, TeachingSlot.period_number, Lesson.year_group)
+        .join(Lesson, TeachingSlot.lesson_id == Lesson.id)
+    ).all())
+
+
+def test_unchanged_file(school):
+    result = run(CURRENT)
+    assert (result.rows, len(result.added), len(result.changed), result.unchanged, result.removed) == (6, 0, 0, 6, [])
+
+
+def test_dry_run_reports_without_writing(school):
+    before = timetable()
+    edited = CURRENT.replace('science@example.com,Monday,2,Maths,Year 7', 'science@example.com,Mon,2,Physics,Year 7')
+    edited = edited.replace('late@example.com,Tuesday,2,Maths,Year 9\n', 'free@example.com,Wed,3,Maths,Year 10\n')
+
+    result = run(edited, dry_run=True, prune=True)
+    assert result.added == [((school.teachers['free'], 2, 3), ('Maths', 'Year 10'))]
+    assert [key for _slot_id, key, _old, _lesson in result.changed] == [(school.teachers['science'], 0, 2)]
+    assert [slot_id for slot_id, _key, _lesson_id in result.removed] == [school.slots[('late', 1, 2)]]
+    assert result.new_lessons == [('Maths', 'Year 10'), ('Physics', 'Year 7')]
+    assert not result.pruned
+    assert timetable() == before
+    assert db.session.execute(db.select(db.func.count(Lesson.id))).scalar() == 3
+
+
+def test_import_writes_and_prunes(school):
+    result = run(CURRENT.replace('late@example.com,Tuesday,2,Maths,Year 9\n', ''), prune=True)
+    assert result.pruned
+    assert db.session.get(TeachingSlot, school.slots[('late', 1, 2)]) is None
+    assert len(timetable()) == 5
+
+
+def test_clash_and_bad_rows_write_nothing(school):
+    before = timetable()
+    with pytest.raises(TimetableImportError) as raised:
+        run(CURRENT + 'maths@example.com,Monday,1,Maths,Year 11\n'
+                      'nobody@example.com,Monday,3,Maths,Year 7\n'
+                      'late@example.com,Someday,1,Maths,Year 7\n'
+                      'late@example.com,Monday,0,Maths,Year 7\n')
+    assert raised.value.errors == [
+        (8, 'maths@example.com is already teaching Maths Year 8 in this period (line 5).'),
+        (9, 'No user with email nobody@example.com.'),
+        (10, "Unknown day 'Someday'."),
+        (11, "Period must be a number from 1 to 15, not '0'."),
+    ]
+    assert timetable() == before
+
+
+def test_missing_columns(school):
+    with pytest.raises(TimetableImportError) as raised:
+        import_timetable(io.StringIO('Email,Day,Subject\n'))
+    assert raised.value.errors == [(1, 'Missing column(s): period, year_group.')]
+
+
+def test_duplicate_slots_are_removed(school):
+    duplicate = TeachingSlot(teacher_id=school.teachers['maths'], day_of_week=0, period_number=1,
+                             lesson_id=db.session.get(TeachingSlot, school.slots[('maths', 0, 1)]).lesson_id)
+    db.session.add(duplicate)
+    db.session.commit()
+    duplicate_id = duplicate.id
+
+    result = run(CURRENT, dry_run=True, prune=True)
+    assert (result.unchanged, [slot_id for slot_id, _key, _lesson_id in result.removed]) == (6, [duplicate_id])
+
+    run(CURRENT, prune=True)
+    assert db.session.get(TeachingSlot, duplicate_id) is None
+    assert db.session.get(TeachingSlot, school.slots[('maths', 0, 1)]) is not None
+
+
+def test_prune_keeps_covered_slots(school):
+    db.session.add(CoverAssignment(absent_teacher_id=school.teachers['late'],
+                                   covering_teacher_id=school.teachers['free'],
+                                   teaching_slot_id=school.slots[('late', 1, 2)], date=MONDAY, period_number=2))
+    db.session.commit()
+
+    result = run(CURRENT.replace('late@example.com,Tuesday,2,Maths,Year 9\n', ''), prune=True)
+    assert result.removed == []
+    assert [slot_id for slot_id, _key, _lesson_id in result.kept] == [school.slots[('late', 1, 2)]]
+    assert db.session.get(TeachingSlot, school.slots[('late', 1, 2)]) is not None
+
+
+def test_prune_keeps_slots_selected_for_partial_day_leave(school):
+    # late is away for the first of their two Tuesday P2 lessons in the range
+    tuesday = MONDAY + timedelta(days=1)
+    leave_request = LeaveRequest(user_id=school.teachers['late'], start_date=tuesday,
+                                 end_date=tuesday + timedelta(weeks=1), status='approved', reason='Personal')
+    leave_request.selected_slots = [LeaveRequestSlot(teaching_slot_id=school.slots[('late', 1, 2)], date=tuesday,
+                                                     period_number=2)]
+    db.session.add(leave_request)
+    db.session.commit()
+
+    result = run(CURRENT.replace('late@example.com,Tuesday,2,Maths,Year 9\n', ''), prune=True)
+    assert result.removed == []
+    assert [slot_id for slot_id, _key, _lesson_id in result.kept] == [school.slots[('late', 1, 2)]]
+    assert db.session.get(TeachingSlot, school.slots[('late', 1, 2)]) is not None